@@ -0,0 +1,940 @@
+"""benchmark.py: micro-benchmarks for the hot paths of publicAmenitiesBerlinTelegramBot, run offline on synthetic Berlin data.
+Needs the packages in requirements-benchmark.txt on top of the bot's own."""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import inspect
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime
+from urllib.parse import parse_qs
+from zipfile import ZipFile
+
+import httpx
+import uvicorn
+from telegram import Bot, Update
+from telegram.ext import Application, CallbackContext
+from telegram.request import BaseRequest
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+import publicAmenitiesBerlinTelegramBot as bot
+
+# Bounding box of Berlin, taken from the extremes of bot.plz_map
+BERLIN_LAT = (52.38, 52.64)
+BERLIN_LON = (13.10, 13.76)
+
+
+def synthetic_amenities(n: int, seed: int = 0) -> pd.DataFrame:
+    """Return n random amenities inside Berlin's bounding box, shaped like the loaders' output."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Name': [f"Amenity {i}" for i in range(n)],
+        'Breitengrad': rng.uniform(*BERLIN_LAT, n),
+        'Laengengrad': rng.uniform(*BERLIN_LON, n),
+    })
+
+
+def random_locations(n: int, seed: int = 1) -> list[tuple[float, float]]:
+    rng = np.random.default_rng(seed)
+    return list(zip(rng.uniform(*BERLIN_LAT, n), rng.uniform(*BERLIN_LON, n)))
+
+
+def rowwise_location_cal(df: pd.DataFrame, my_location: tuple[float, float]) -> pd.DataFrame:
+    """The original row-wise implementation of location_cal, kept as the reference."""
+    df = df.copy()
+    df['Distance'] = df.apply(lambda row: bot.haversine_distance(my_location[0], my_location[1],
+                                                                 row.Breitengrad, row.Laengengrad), axis=1)
+    return df.nsmallest(5, 'Distance')
+
+
+def synthetic_toilettes_xlsx(path: str, n: int, seed: int = 0) -> None:
+    """Write a sheet laid out like berliner-toiletten-standorte.xlsx: title rows above the
+    'Bezirk' header, comma decimal coordinates, numeric Vertrag codes and hidden rows."""
+    rng = np.random.default_rng(seed)
+    wb = Workbook()
+    sheet = wb.active
+    sheet.title = 'Berlinweit'
+    sheet.append(["Öffentliche Toiletten in Berlin"])
+    sheet.append([])
+    sheet.append(["Bezirk", "Standort", "LavatoryID", "Breitengrad", "Laengengrad", "Vertrag", "Preis"])
+    lat, lon = rng.uniform(*BERLIN_LAT, n), rng.uniform(*BERLIN_LON, n)
+    for i in range(n):
+        vertrag = int(rng.integers(1, 6)) if i % 50 else "k.A."
+        sheet.append([f"Bezirk {i % 12}", f"Straße {i}", f"4{i:05d}",
+                      f"{lat[i]:.6f}".replace('.', ','), float(lon[i]), vertrag, 0.5])
+        if i % 10 == 9:
+            sheet.row_dimensions[sheet.max_row].hidden = True
+    wb.save(path)
+
+
+def openpyxl_parse_toilettes(filename: str) -> pd.DataFrame:
+    """The original three-pass parser of update_toilettes, kept as the reference."""
+    sheet_name = 'Berlinweit'
+    wb = load_workbook(filename)
+    sheet = wb[sheet_name]
+    visible_rows = [row - 1 for row in range(1, sheet.max_row + 1) if not sheet.row_dimensions[row].hidden]
+    df_temp = pd.read_excel(filename, sheet_name=sheet_name, header=None, skiprows=lambda x: x not in visible_rows)
+    header_row = df_temp.index[df_temp.iloc[:, 0] == 'Bezirk'].tolist()
+    df_wc = pd.read_excel(filename, sheet_name=sheet_name, header=0,
+                          skiprows=lambda x: x not in visible_rows or x < header_row[0])
+    df_wc['Vertrag'] = pd.to_numeric(df_wc['Vertrag'], errors='coerce')
+    df_wc['Vertrag'] = df_wc['Vertrag'].map(bot.vertrag_map).fillna(df_wc['Vertrag'])
+    df_wc['Breitengrad'] = df_wc['Breitengrad'].apply(bot.convert_to_float)
+    df_wc['Laengengrad'] = df_wc['Laengengrad'].apply(bot.convert_to_float)
+    return df_wc
+
+
+def synthetic_fountains_kmz(n: int, seed: int = 0) -> bytes:
+    """Return a KMZ laid out like the BWB Trinkbrunnen map: point Placemarks in a Folder
+    with CDATA descriptions, plus one Placemark without a point."""
+    rng = np.random.default_rng(seed)
+    lat, lon = rng.uniform(*BERLIN_LAT, n), rng.uniform(*BERLIN_LON, n)
+    placemarks = "".join(
+        f"<Placemark><name>Trinkbrunnen {i}</name><description><![CDATA[Brunnen <b>{i}</b>]]></description>"
+        f"<styleUrl>#icon</styleUrl><Point><coordinates>\n  {lon[i]:.7f},{lat[i]:.7f},0\n</coordinates></Point></Placemark>"
+        for i in range(n))
+    kml = ('<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+           '<name>Trinkbrunnen</name><Folder><name>Berlin</name>'
+           f'{placemarks}<Placemark><name>Legende</name></Placemark></Folder></Document></kml>')
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as kmz:
+        kmz.writestr('doc.kml', kml)
+    return buffer.getvalue()
+
+
+def synthetic_police_html(n: int, date: str, seed: int = 0, routes: list[tuple[list[str], int]] | None = None) -> str:
+    """Return a page laid out like the police's list of assemblies: n rows, a quarter of them
+    on other days, some with a PLZ outside plz_map and a few without a PLZ at all. Given
+    (street names, PLZ) routes, row i starts in the first street of routes[i % len(routes)],
+    in its PLZ, and marches along the rest; every other row without a known PLZ takes a
+    route through Hauptstraße, which only the streets after it can place."""
+    rng = np.random.default_rng(seed)
+    codes = list(bot.plz_map)
+    namesakes = [route for route in routes or () if route[0][0] == "Hauptstraße"]
+    rows = []
+    for i in range(n):
+        plz = "" if i % 25 == 24 else 99999 if i % 10 == 9 else codes[rng.integers(len(codes))]
+        cells = {"Datum": date if i % 4 else "01.01.2000", "Von": f"{8 + i % 12:02d}:00", "Bis": "22:00",
+                 "Thema": f"Versammlung {i}", "PLZ": plz, "Versammlungsort": f"Platz {i}",
+                 "Aufzugsstrecke": f"Straße {i} - Allee {i}"}
+        if routes:
+            names, route_plz = routes[i % len(routes)]
+            if namesakes and plz in (99999, "") and i % 20 in (9, 24):
+                names, route_plz = namesakes[i % len(namesakes)]
+            cells["Versammlungsort"] = f"{names[0]} {i % 90 + 1}"
+            cells["Aufzugsstrecke"] = " - ".join(names[1:])
+            cells["PLZ"] = route_plz if isinstance(plz, int) and plz != 99999 else plz
+        rows.append(f'<tr class="{"odd line_1" if i % 2 else "even line_2"}">'
+                    + "".join(f'<td class="text" headers="{name}">{value}</td>' for name, value in cells.items())
+                    + "</tr>")
+    return (f'<html><body><nav><a href="/">Polizei Berlin</a></nav><table><thead><tr>'
+            + "".join(f'<th id="{name}">{name}</th>' for name in bot.demo_columns)
+            + f'</tr></thead><tbody>{"".join(rows)}</tbody></table></body></html>')
+
+
+def letters(i: int) -> str:
+    """Spell i in letters, since street_key drops numbers from names."""
+    word = ""
+    while True:
+        i, digit = divmod(i, 26)
+        word += "abcdefghijklmnopqrstuvwxyz"[digit]
+        if i == 0:
+            return word.capitalize()
+
+
+def synthetic_osm(path: str, chains: int, streets_per_chain: int = 4, seed: int = 5) -> list[list[str]]:
+    """Write an OpenStreetMap XML file of chains of named streets, each street a few ways of
+    ~100 m steps starting where the previous street ended, plus unnamed and non-highway
+    ways the gazetteer must skip, and a Hauptstraße in two districts. Returns the street
+    names of every chain with the PLZ whose centroid is closest to its start, usable as
+    routes; every fifth one starts in the western Hauptstraße."""
+    rng = np.random.default_rng(seed)
+    step = 0.1 / 111.2
+    nodes, ways, node_id, way_id = [], [], 1, 1
+    chain_names = []
+
+    def add_way(points, tags):
+        nonlocal node_id, way_id
+        refs = []
+        for lat, lon in points:
+            nodes.append(f'<node id="{node_id}" lat="{lat:.7f}" lon="{lon:.7f}" version="1"/>')
+            refs.append(node_id)
+            node_id += 1
+        ways.append(f'<way id="{way_id}">' + "".join(f'<nd ref="{ref}"/>' for ref in refs)
+                    + "".join(f'<tag k="{k}" v="{v}"/>' for k, v in tags.items()) + '</way>')
+        way_id += 1
+
+    for town, (lat, lon) in enumerate(((52.45, 13.20), (52.60, 13.65))):
+        add_way([(lat + i * step, lon) for i in range(10)], {'highway': 'primary', 'name': 'Hauptstraße'})
+    for chain in range(chains):
+        position = np.array([rng.uniform(*BERLIN_LAT), rng.uniform(*BERLIN_LON)])
+        if chain % 5 == 0:
+            position = np.array([52.45 + 9 * step, 13.20])
+        names = ["Hauptstraße"] if chain % 5 == 0 else []
+        plz = int(bot.plz_codes[np.argmin(np.hypot(*(bot.plz_centroids - position[::-1]).T))])
+        for street in range(streets_per_chain):
+            name = f"{letters(chain * streets_per_chain + street)}straße"
+            heading = rng.uniform(0, 2 * np.pi)
+            for _ in range(2):
+                steps = int(rng.integers(3, 15))
+                points = position + np.cumsum(np.column_stack((np.full(steps, np.sin(heading)), np.full(steps, np.cos(heading) * 1.64)))
+                                              * step, axis=0)
+                add_way(np.vstack((position, points)), {'highway': 'residential', 'name': name})
+                position = points[-1]
+            names.append(name)
+        chain_names.append((names, plz))
+        add_way([position, position + step], {'highway': 'service'})
+        add_way([position, position + step], {'building': 'yes', 'name': names[-1]})
+    with open(path, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+                   + "\n".join(nodes) + "\n" + "\n".join(ways) + '\n</osm>\n')
+    return chain_names
+
+
+def brute_force_routes(routes, my_location: tuple[float, float], k: int) -> tuple[np.ndarray, np.ndarray]:
+    """RouteIndex.nearest measuring every segment, as the reference."""
+    point = bot.project([my_location[0]], [my_location[1]])[0]
+    rows, distances = routes._row_minimum(point, np.arange(len(routes.segments)))
+    distances = np.round(distances, 2)
+    best = np.lexsort((rows, distances))[:k]
+    return rows[best], distances[best]
+
+
+def bench_routes(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        osm = os.path.join(tmp, 'berlin.osm')
+        routes = synthetic_osm(osm, args.chains)
+        bot.STREET_GAZETTEER = os.path.join(tmp, 'streets.npz')
+        measure("build_gazetteer", bot.build_gazetteer, osm, bot.STREET_GAZETTEER)
+        date = datetime.now().strftime("%d.%m.%Y")
+        page = synthetic_police_html(args.size, date, routes=routes).encode()
+
+        bot.route_cache = {}
+        start = time.perf_counter()
+        df = bot.parse_police_demo_data(page, date)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        bot.parse_police_demo_data(page, date)
+        warm = time.perf_counter() - start
+        routed = sum(1 for route in df['Route'] if len(route))
+        print(f"{'parse with routes (cold)':<28} {cold * 1e3:10.1f} ms")
+        print(f"{'parse with routes (cached)':<28} {warm * 1e3:10.1f} ms")
+        print(f"{routed} of {len(df)} demonstrations routed, {len(bot.route_cache)} routes cached")
+
+        # Routes through the western Hauptstraße must not pick up its eastern namesake, with
+        # or without a PLZ to start from
+        hauptstrasse = df[df['Versammlungsort'].str.startswith("Hauptstraße")]
+        for route in hauptstrasse['Route']:
+            assert len(route) and np.nanmax(route.reshape(-1, 2)[:, 1]) < 13.5, "namesake in the wrong district"
+        without_plz = int((~hauptstrasse['PLZ'].isin(bot.plz_map)).sum())
+        assert without_plz, "no Hauptstraße demonstration without a known PLZ"
+        print(f"{len(hauptstrasse)} demonstrations through Hauptstraße, {without_plz} without a known PLZ, none off course")
+
+        snapshot = bot.AmenitySnapshot(df)
+        index = snapshot.routes
+        print(f"RouteIndex: {len(index.segments)} segments of at most {bot.ROUTE_SEGMENT_KM * 1000:.0f} m")
+        locations = random_locations(args.queries)
+        for location in locations[:1000]:
+            for k in (1, 3, 5):
+                expected, got = brute_force_routes(index, location, k), index.nearest(location, k)
+                assert np.array_equal(expected[0], got[0]) and np.array_equal(expected[1], got[1]), location
+        print("indexed results identical to measuring every segment for 1000 queries")
+        report_latencies("every segment", latencies(lambda loc: brute_force_routes(index, loc, 3), locations))
+        report_latencies("RouteIndex.nearest", latencies(lambda loc: index.nearest(loc, 3), locations))
+        report_latencies("location_cal", latencies(lambda loc: bot.location_cal(snapshot, loc, 3), locations))
+
+
+# Sizes of the real lists: toilets in the sheet, BWB fountains and a busy day of demonstrations
+REAL_SIZES = {"wc": 450, "water": 230, "demo": 60}
+KMZ_URL = "https://www.bwb.de/de/assets/downloads/Trinkbrunnen.kmz"
+
+
+def write_synthetic_fixtures(directory: str, scale: float = 1.0) -> None:
+    """Write synthetic source responses, REAL_SIZES times scale, in the layout ReplayTransport serves."""
+    os.makedirs(directory, exist_ok=True)
+    size = {choice: max(1, round(n * scale)) for choice, n in REAL_SIZES.items()}
+    synthetic_toilettes_xlsx(os.path.join(directory, 'toiletten.xlsx'), size["wc"])
+    with open(os.path.join(directory, 'trinkbrunnen.kmz'), 'wb') as file:
+        file.write(synthetic_fountains_kmz(size["water"]))
+    with open(os.path.join(directory, 'trinkbrunnen.html'), 'w') as file:
+        file.write(f'<html><a class="trinkbrunnen" href="{KMZ_URL}">Trinkbrunnen (KMZ)</a></html>')
+    with open(os.path.join(directory, 'versammlungen.html'), 'w') as file:
+        file.write(synthetic_police_html(size["demo"], datetime.now().strftime("%d.%m.%Y")))
+    recordings = {
+        bot.TOILETTEN_URL: {'file': 'toiletten.xlsx', 'headers': {'ETag': f'"wc-{scale}"'}},
+        bot.BWB_URL: {'file': 'trinkbrunnen.html'},
+        KMZ_URL: {'file': 'trinkbrunnen.kmz', 'headers': {'ETag': f'"water-{scale}"'}},
+        bot.EVENT_URL: {'file': 'versammlungen.html'},
+    }
+    with open(os.path.join(directory, 'index.json'), 'w') as file:
+        json.dump(recordings, file, indent=1)
+
+
+def kml2geojson_parse_fountains(kmz_content: bytes) -> pd.DataFrame:
+    """The original temp-file and kml2geojson parser of update_water, kept as the reference."""
+    import kml2geojson
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'Trinkbrunnen.kmz'), 'wb') as file:
+            file.write(kmz_content)
+        kml = ZipFile(os.path.join(tmp, 'Trinkbrunnen.kmz')).open('doc.kml', 'r').read()
+        with open(os.path.join(tmp, 'Trinkbrunnen.xml'), 'w') as file:
+            file.write(str(kml, 'utf-8'))
+        converted = kml2geojson.main.convert(os.path.join(tmp, 'Trinkbrunnen.xml'), "leaflet")
+    # kml2geojson 5 wraps the list of feature collections in a dict
+    features = (converted["feature_collections"] if isinstance(converted, dict) else converted)[0]["features"]
+    return pd.DataFrame.from_dict([{'Name': feature["properties"]["name"],
+                                    'Description': feature["properties"].get("description"),
+                                    'Laengengrad': feature["geometry"]["coordinates"][0],
+                                    'Breitengrad': feature["geometry"]["coordinates"][1]}
+                                   for feature in features if feature["geometry"]])
+
+
+def measure(name: str, func, *args):
+    """Run func twice, printing its wall time and the peak traced memory of a second,
+    traced run, and return its result."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<28} {elapsed * 1e3:10.1f} ms {peak / 2**20:10.1f} MiB peak")
+    return result
+
+
+def report(name: str, seconds: list[float], number: int) -> float:
+    best = min(seconds) / number
+    print(f"{name:<28} {best * 1e6:10.1f} us")
+    return best
+
+
+def bench_location_cal(args) -> None:
+    df = synthetic_amenities(args.size)
+    locations = random_locations(args.queries)
+    coordinates = bot.radian_coordinates(df)
+    snapshot = bot.AmenitySnapshot(df)
+
+    for location in locations:
+        expected = rowwise_location_cal(df, location)
+        actual = bot.location_cal(snapshot, location)
+        assert [row['Name'] for row in actual] == expected['Name'].tolist(), location
+        assert [row['Distance'] for row in actual] == expected['Distance'].tolist(), location
+    print(f"{len(locations)} queries over {args.size} amenities: results identical")
+
+    loc = locations[0]
+    old = report("row-wise apply", timeit.repeat(lambda: rowwise_location_cal(df, loc), number=3, repeat=3), 3)
+    new = report("location_cal (snapshot)", timeit.repeat(lambda: bot.location_cal(snapshot, loc),
+                                                         number=100, repeat=5), 100)
+    report("nearest_amenities only", timeit.repeat(lambda: bot.nearest_amenities(*coordinates, loc),
+                                                   number=100, repeat=5), 100)
+    print(f"speed-up: {old / new:.0f}x")
+
+
+def bench_index(args) -> None:
+    df = synthetic_amenities(args.size)
+    locations = random_locations(args.queries)
+    coordinates = bot.radian_coordinates(df)
+    index = bot.AmenityIndex(*coordinates)
+
+    for location in locations:
+        positions, distances = bot.nearest_amenities(*coordinates, location, k=len(df))
+        nearest = index.nearest(location)
+        assert np.array_equal(nearest[0], positions[:5]) and np.array_equal(nearest[1], distances[:5]), location
+        within = index.within(location, args.radius)
+        inside = distances <= args.radius
+        assert set(within[0]) == set(positions[inside]), location
+    print(f"{len(locations)} queries over {args.size} amenities: results identical")
+
+    loc = locations[0]
+    report("build index", timeit.repeat(lambda: bot.AmenityIndex(*bot.radian_coordinates(df)),
+                                        number=1, repeat=3), 1)
+    scan = report("vectorized scan", timeit.repeat(lambda: bot.nearest_amenities(*coordinates, loc),
+                                                   number=100, repeat=5), 100)
+    tree = report("index nearest", timeit.repeat(lambda: index.nearest(loc), number=100, repeat=5), 100)
+    report(f"index within {args.radius} km", timeit.repeat(lambda: index.within(loc, args.radius),
+                                                        number=100, repeat=5), 100)
+    print(f"speed-up: {scan / tree:.1f}x")
+
+
+def bench_xlsx(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = args.file
+        if filename is None:
+            filename = os.path.join(tmp, 'berliner-toiletten-standorte.xlsx')
+            synthetic_toilettes_xlsx(filename, args.size)
+        old = measure("openpyxl + read_excel x2", openpyxl_parse_toilettes, filename)
+        new = measure("streaming parse_toilettes", bot.parse_toilettes, filename)
+
+    assert list(new.columns) == list(old.columns), (list(new.columns), list(old.columns))
+    # read_excel also turns numeric-looking text such as IDs into numbers; the bot only uses these columns
+    for column in ('Standort', 'Breitengrad', 'Laengengrad', 'Vertrag'):
+        pd.testing.assert_series_equal(new[column].reset_index(drop=True), old[column].reset_index(drop=True),
+                                       check_dtype=False)
+    print(f"{len(new)} toilets: Standort, coordinates and Vertrag identical")
+
+
+def bench_kmz(args) -> None:
+    if args.file is None:
+        kmz_content = synthetic_fountains_kmz(args.size)
+    else:
+        with open(args.file, 'rb') as file:
+            kmz_content = file.read()
+    new = measure("streaming parse_fountains", bot.parse_fountains, kmz_content)
+    try:
+        old = measure("temp files + kml2geojson", kml2geojson_parse_fountains, kmz_content)
+    except ImportError:
+        print(f"{len(new)} fountains; install kml2geojson from requirements-benchmark.txt to compare "
+              "against the original parser")
+        return
+
+    for column in ('Name', 'Laengengrad', 'Breitengrad'):
+        pd.testing.assert_series_equal(new[column], old[column], check_dtype=False)
+    print(f"{len(new)} fountains: names and coordinates identical")
+
+
+def hotspot_locations(n: int, hotspots: int = 20, spread_km: float = 0.2, seed: int = 2) -> list[tuple[float, float]]:
+    """Return n locations scattered around a few hotspots, like users at stations and parks."""
+    rng = np.random.default_rng(seed)
+    centers = np.array(random_locations(hotspots, seed))
+    picks = centers[rng.integers(0, hotspots, n)]
+    jitter = rng.normal(0, spread_km / 111.2, (n, 2)) / [1, np.cos(np.radians(52.5))]
+    return [tuple(location) for location in picks + jitter]
+
+
+def bench_cache(args) -> None:
+    snapshot = bot.AmenitySnapshot(synthetic_amenities(args.size))
+    coordinates = (snapshot.index.lat_rad, snapshot.index.lon_rad)
+    locations = hotspot_locations(args.queries)
+    bot.nearest_cache = bot.NearestCache(max_entries=args.entries)
+
+    bot.NEAREST_CACHE = True
+    start = time.perf_counter()
+    results = [bot.location_cal(snapshot, location, k=3) for location in locations]
+    cached = (time.perf_counter() - start) / len(locations)
+    bot.NEAREST_CACHE = False
+    for location, result in zip(locations, results):
+        positions, distances = bot.nearest_amenities(*coordinates, location, k=3)
+        assert [row['Name'] for row in result] == [f"Amenity {p}" for p in positions], location
+        assert [row['Distance'] for row in result] == distances.tolist(), location
+    print(f"{len(locations)} hotspot queries over {args.size} amenities: results identical")
+
+    start = time.perf_counter()
+    for location in locations:
+        bot.location_cal(snapshot, location, k=3)
+    uncached = (time.perf_counter() - start) / len(locations)
+    print(f"{'NEAREST_CACHE off':<28} {uncached * 1e3:10.3f} ms")
+    print(f"{'NEAREST_CACHE on':<28} {cached * 1e3:10.3f} ms")
+    print(bot.nearest_cache.stats())
+
+
+def latencies(func, locations) -> np.ndarray:
+    timings = np.empty(len(locations))
+    for i, location in enumerate(locations):
+        start = time.perf_counter()
+        func(location)
+        timings[i] = time.perf_counter() - start
+    return timings
+
+
+def report_latencies(name: str, timings: np.ndarray) -> None:
+    p50, p99 = np.percentile(timings, [50, 99]) * 1e6
+    print(f"{name:<28} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+def bench_grid(args) -> None:
+    snapshot = bot.AmenitySnapshot(synthetic_amenities(args.size))
+    index = snapshot.index
+    tracemalloc.start()
+    start = time.perf_counter()
+    grid = bot.GridTable(index, cell_m=args.cell, shards=args.shards)
+    build = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"GridTable {grid.n_lat}x{grid.n_lon} cells of {args.cell:.0f} m: built in {build:.2f} s "
+          f"with {args.shards} shard(s), {grid.nbytes / 2**20:.1f} MiB stored, {peak / 2**20:.1f} MiB peak, "
+          f"{len(grid.positions) / (grid.n_lat * grid.n_lon):.1f} candidates per cell")
+
+    locations = random_locations(args.queries)
+    for location in locations[:1000]:
+        assert np.array_equal(index.rank(location, grid.candidates(location, 5), 5)[0],
+                              index.nearest(location)[0]), location
+    print("grid results identical to the index for 1000 queries")
+
+    bot.nearest_cache = bot.NearestCache()
+    report_latencies("index.nearest", latencies(index.nearest, locations))
+    report_latencies("NearestCache (cold, uniform)",
+                     latencies(lambda loc: index.rank(loc, bot.nearest_cache.candidates(snapshot, loc, 5), 5), locations))
+    report_latencies("GridTable", latencies(lambda loc: index.rank(loc, grid.candidates(loc, 5), 5), locations))
+
+
+def memory_kib() -> dict:
+    """Return this process's Rss, Pss and private memory in KiB from /proc/self/smaps_rollup."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def shared_worker(mode: str, source: str, queries: int, barrier, results) -> None:
+    """Serve queries from the shared snapshot (mode 'shared') or from a snapshot built in this
+    process as every worker did before (mode 'private'), and report the memory it took."""
+    before = memory_kib()
+    if mode == 'shared':
+        bot.SHARED_DIR, bot.shared_role = source, "worker"
+        snapshot = bot.current_amenities()['wc']
+    else:
+        snapshot = bot.AmenitySnapshot(pd.read_pickle(source))
+    timings = latencies(lambda loc: bot.location_cal(snapshot, loc, 3), random_locations(queries, seed=os.getpid()))
+    # Measure while all workers are alive so shared pages are split between them in Pss
+    barrier.wait()
+    after = memory_kib()
+    barrier.wait()
+    results.put(({name: after[name] - before[name] for name in after}, np.percentile(timings, [50, 99])))
+
+
+def bench_shared(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        df = synthetic_amenities(args.size)
+        df.to_pickle(os.path.join(tmp, 'wc.pkl'))
+        bot.SHARED_DIR = os.path.join(tmp, 'shared')
+        measure("publish_shared", bot.publish_shared, 'wc', bot.AmenitySnapshot(df))
+
+        context = multiprocessing.get_context('spawn')
+        for mode, source in (('private', os.path.join(tmp, 'wc.pkl')), ('shared', bot.SHARED_DIR)):
+            for workers in sorted({1, args.workers}):
+                barrier, results = context.Barrier(workers), context.Queue()
+                processes = [context.Process(target=shared_worker, args=(mode, source, args.queries, barrier, results))
+                             for _ in range(workers)]
+                for process in processes:
+                    process.start()
+                reports = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                memory = {name: np.mean([report[0][name] for report in reports]) / 1024 for name in reports[0][0]}
+                p50, p99 = np.mean([report[1] for report in reports], axis=0) * 1e6
+                print(f"{mode:8s} {workers} worker(s): per worker {memory['private']:7.1f} MiB private "
+                      f"{memory['pss']:7.1f} MiB Pss {memory['rss']:7.1f} MiB Rss, "
+                      f"location_cal p50 {p50:.1f} us p99 {p99:.1f} us")
+
+
+def fuzz_callbacks(rounds: int, seed: int = 3) -> None:
+    """Round-trip random payloads and feed random strings to the decoder, which must either
+    raise ValueError or return a valid choice and location."""
+    rng = np.random.default_rng(seed)
+    for _ in range(rounds):
+        choice = bot.callback_choices[rng.integers(len(bot.callback_choices))]
+        location = (float(rng.uniform(-90, 90)), float(rng.uniform(-180, 180)))
+        version = int(rng.integers(0, 2**32))
+        data = bot.encode_callback(choice, location, version)
+        assert len(data.encode()) <= 64, data
+        decoded_choice, decoded_location, decoded_version = bot.decode_callback(data)
+        assert (decoded_choice, decoded_version) == (choice, version), data
+        assert max(abs(a - b) for a, b in zip(decoded_location, location)) <= 0.5 / bot.COORDINATE_SCALE, data
+
+    alphabet = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=+/,. "))
+    rejected = 0
+    for i in range(rounds):
+        if i % 2:
+            data = ''.join(rng.choice(alphabet, rng.integers(0, 30)))
+        else:
+            # A valid payload with one character replaced
+            data = list(bot.encode_callback("wc", (52.5, 13.4), i))
+            data[rng.integers(len(data))] = rng.choice(alphabet)
+            data = ''.join(data)
+        try:
+            choice, location, _ = bot.decode_callback(data)
+        except ValueError:
+            rejected += 1
+            continue
+        assert choice in bot.callback_choices and abs(location[0]) <= 90 and abs(location[1]) <= 180, data
+    print(f"fuzzed {rounds} round trips and {rounds} random or mutated strings ({rejected} rejected)")
+
+
+def bench_callback(args) -> None:
+    fuzz_callbacks(args.fuzz)
+    location, version = (52.520008123456, 13.404954987654), 12345
+    legacy = f"water,{location[0]},{location[1]}"
+    payload = bot.encode_callback("water", location, version)
+    print(f"legacy payload {len(legacy)} bytes, packed payload {len(payload)} bytes")
+
+    def legacy_round_trip():
+        choice, lat, lon = f"water,{location[0]},{location[1]}".split(',')
+        return choice, (float(lat), float(lon))
+
+    report("legacy f-string + split", timeit.repeat(legacy_round_trip, number=10_000, repeat=5), 10_000)
+    report("encode_callback", timeit.repeat(lambda: bot.encode_callback("water", location, version),
+                                            number=10_000, repeat=5), 10_000)
+    report("decode_callback", timeit.repeat(lambda: bot.decode_callback(payload), number=10_000, repeat=5), 10_000)
+
+
+def bot_api_result(method: str, params: dict, message_id: int):
+    """Return what the Bot API answers to the methods the bot calls."""
+    if method == 'getMe':
+        return {'id': 1, 'is_bot': True, 'first_name': "Stub", 'username': "stub_bot"}
+    if method in ('sendMessage', 'sendDocument'):
+        return {'message_id': message_id, 'date': int(time.time()), 'text': params.get('text', ""),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'}}
+    return True
+
+
+class TelegramStub:
+    """Minimal stand-in for the Bot API: answers the methods the bot calls and records when
+    each chat received its reply."""
+
+    def __init__(self):
+        self.replies = {}
+        self.calls = 0
+        self.replied = asyncio.Event()
+        self.expected = 0
+
+    async def app(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            return
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body += message.get('body', b"")
+            more = message.get('more_body', False)
+        headers = dict(scope['headers'])
+        if headers.get(b'content-type', b"").startswith(b'application/json'):
+            params = json.loads(body or b"{}")
+        else:
+            params = {name: values[0] for name, values in parse_qs(body.decode()).items()}
+        self.calls += 1
+        method = scope['path'].rsplit('/', 1)[-1]
+        if method == 'sendMessage':
+            self.replies.setdefault(int(params['chat_id']), time.perf_counter())
+            if len(self.replies) >= self.expected:
+                self.replied.set()
+        result = bot_api_result(method, params, self.calls)
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+def synthetic_updates(n: int, versions: dict, seed: int = 4) -> list[dict]:
+    """Return n updates alternating between shared locations and amenity button presses,
+    each from its own chat so its reply can be matched."""
+    rng = np.random.default_rng(seed)
+    updates = []
+    for i, location in enumerate(random_locations(n, seed)):
+        chat_id = 1000 + i
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f"User {i}"}
+        message = {'message_id': i + 1, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'},
+                   'from': user}
+        if i % 2:
+            choice = bot.callback_choices[rng.integers(len(bot.callback_choices))]
+            updates.append({'update_id': i + 1, 'callback_query': {
+                'id': str(i), 'from': user, 'chat_instance': str(chat_id),
+                'data': bot.encode_callback(choice, location, versions.get(choice, 0)),
+                'message': {**message, 'text': "Which public amenity are you looking to find?"}}})
+        else:
+            updates.append({'update_id': i + 1, 'message': {
+                **message, 'location': {'latitude': location[0], 'longitude': location[1]}}})
+    return updates
+
+
+async def wait_started(server: uvicorn.Server, task: asyncio.Task) -> None:
+    """Wait until server listens, surfacing the error if the task serving it failed first."""
+    while not server.started:
+        if task.done():
+            task.result()
+            raise RuntimeError("server stopped before it started")
+        await asyncio.sleep(0.01)
+
+
+async def run_webhook_load(args, directory: str) -> None:
+    fixtures = os.path.join(directory, 'fixtures')
+    write_synthetic_fixtures(fixtures, args.scale)
+    bot.CACHE_DIR = os.path.join(directory, 'cache')
+    bot.source_client = bot.SourceClient(bot.ReplayTransport(fixtures))
+
+    stub = TelegramStub()
+    stub_server = uvicorn.Server(uvicorn.Config(stub.app, host="127.0.0.1", port=args.port + 1,
+                                                interface="asgi3", lifespan="off", log_level="warning"))
+    stub_task = asyncio.create_task(stub_server.serve())
+    await wait_started(stub_server, stub_task)
+
+    bot.TOKEN = "123456:stub"
+    bot.TELEGRAM_API_URL = f"http://127.0.0.1:{args.port + 1}/bot"
+    bot.WEBHOOK_URL = f"http://127.0.0.1:{args.port}/telegram"
+    bot.WEBHOOK_LISTEN = ("127.0.0.1", args.port)
+    bot.WEBHOOK_SECRET = "benchmark-secret"
+    bot.CONCURRENT_UPDATES = args.concurrent
+    application = bot.build_application()
+    server = bot.webhook_server(application)
+    bot_task = asyncio.create_task(bot.run_webhook(application, server))
+    await wait_started(server, bot_task)
+
+    updates = synthetic_updates(args.updates, {choice: s.version for choice, s in bot.amenities.items()})
+    stub.expected = len(updates)
+    sent = {}
+    limit = asyncio.Semaphore(args.clients)
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.clients)) as client:
+        async def post(update):
+            async with limit:
+                chat_id = (update.get('message') or update['callback_query']['message'])['chat']['id']
+                sent[chat_id] = time.perf_counter()
+                response = await client.post(bot.WEBHOOK_URL, json=update,
+                                             headers={'X-Telegram-Bot-Api-Secret-Token': bot.WEBHOOK_SECRET})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        try:
+            await asyncio.wait_for(stub.replied.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            print(f"only {len(stub.replies)} of {len(updates)} updates were answered")
+        elapsed = max(stub.replies.values(), default=start) - start
+
+    server.should_exit = True
+    await bot_task
+    stub_server.should_exit = True
+    await stub_task
+
+    timings = np.array([stub.replies[chat] - sent[chat] for chat in stub.replies])
+    print(f"{len(stub.replies)} updates answered in {elapsed:.2f} s: {len(stub.replies) / elapsed:.0f} updates/s "
+          f"with {args.concurrent} concurrent updates and {args.clients} clients")
+    report_latencies("update -> reply", timings)
+    print(bot.stats_text())
+
+
+class InProcessRequest(BaseRequest):
+    """Answers the bot's API calls in process, so handlers can be timed without any network."""
+
+    def __init__(self):
+        self.calls = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        self.calls += 1
+        params = request_data.parameters if request_data is not None else {}
+        result = bot_api_result(url.rsplit('/', 1)[-1], params, self.calls)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+async def time_stage(func, inputs) -> dict:
+    """Call func on every input, awaiting it if it is a coroutine, and return p50/p99 latency,
+    throughput and the peak traced memory of a second, traced pass over the first inputs."""
+    async def call(value):
+        result = func(value)
+        if inspect.isawaitable(result):
+            await result
+
+    timings = np.empty(len(inputs))
+    for i, value in enumerate(inputs):
+        start = time.perf_counter()
+        await call(value)
+        timings[i] = time.perf_counter() - start
+    tracemalloc.start()
+    for value in inputs[:100]:
+        await call(value)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    p50, p99 = np.percentile(timings, [50, 99])
+    return {'n': len(inputs), 'p50_us': p50 * 1e6, 'p99_us': p99 * 1e6,
+            'throughput': len(inputs) / timings.sum(), 'peak_mib': peak / 2**20}
+
+
+async def run_suite(label: str, fixtures: str, args) -> dict:
+    """Time every stage against one set of source fixtures: the real loaders replaying them,
+    snapshot builds, location_cal, and the button and pick_one handlers on fake updates."""
+    bot.source_client = bot.SourceClient(bot.ReplayTransport(fixtures))
+    bot.nearest_cache = bot.NearestCache()
+    results, frames = {}, {}
+    try:
+        for choice, loader in bot.sources.items():
+            frames[choice] = await loader()
+            results[f"load_{choice}"] = await time_stage(lambda _: loader(), [None] * args.rounds)
+            results[f"snapshot_{choice}"] = await time_stage(lambda df: bot.AmenitySnapshot(df), [frames[choice]] * args.rounds)
+    finally:
+        await bot.source_client.aclose()
+        bot.source_client = None
+    bot.amenities = {choice: bot.AmenitySnapshot(df) for choice, df in frames.items()}
+
+    locations = random_locations(args.queries)
+    for choice, snapshot in bot.amenities.items():
+        results[f"location_cal_{choice}"] = await time_stage(lambda loc: bot.location_cal(snapshot, loc, 3), locations)
+
+    application = Application.builder().bot(Bot("123456:stub", request=InProcessRequest())).build()
+    await application.initialize()
+    try:
+        updates = [Update.de_json(data, application.bot) for data in
+                   synthetic_updates(args.updates, {choice: snapshot.version for choice, snapshot in bot.amenities.items()})]
+        handlers = {'button': (bot.button, [update for update in updates if update.message]),
+                    'pick_one': (bot.pick_one, [update for update in updates if update.callback_query])}
+        for name, (handler, stage_updates) in handlers.items():
+            results[name] = await time_stage(
+                lambda update: handler(update, CallbackContext.from_update(update, application)), stage_updates)
+    finally:
+        await application.shutdown()
+    return {f"{stage}@{label}": result for stage, result in results.items()}
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the stages that got slower, or use more memory, than the baseline allows."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ('p50_us', 'p99_us', 'peak_mib'):
+            # Peaks below 1 MiB are within tracemalloc's noise
+            if result[metric] > before[metric] * (1 + tolerance) + (1.0 if metric == 'peak_mib' else 0.0):
+                regressions.append(f"{key} {metric}: {before[metric]:.1f} -> {result[metric]:.1f}")
+        if result['throughput'] < before['throughput'] / (1 + tolerance):
+            regressions.append(f"{key} throughput: {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s")
+    return regressions
+
+
+def bench_suite(args) -> None:
+    for name in ('httpx', 'telegram', 'publicAmenitiesBerlinTelegramBot'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        suites = [(f"{scale:g}x", os.path.join(tmp, f"{scale:g}x")) for scale in args.scales]
+        for (label, directory), scale in zip(suites, args.scales):
+            write_synthetic_fixtures(directory, scale)
+        if args.fixtures:
+            suites.append(("recorded", args.fixtures))
+        for label, directory in suites:
+            results.update(asyncio.run(run_suite(label, directory, args)))
+
+    print(f"{'stage':<28} {'n':>6} {'p50 us':>10} {'p99 us':>10} {'per s':>10} {'peak MiB':>9}")
+    for key, result in results.items():
+        print(f"{key:<28} {result['n']:6d} {result['p50_us']:10.1f} {result['p99_us']:10.1f} "
+              f"{result['throughput']:10.1f} {result['peak_mib']:9.2f}")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                       'machine': platform.machine(), 'date': datetime.now().isoformat(timespec='seconds'),
+                       'results': results}, file, indent=1)
+        print(f"saved as {args.save}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        print(f"{len(regressions)} regressions against {args.baseline} at {args.tolerance:.0%} tolerance")
+        if regressions:
+            sys.exit(1)
+
+
+def bench_webhook(args) -> None:
+    for name in ('httpx', 'apscheduler', 'telegram.ext'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run_webhook_load(args, tmp))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    locate = subparsers.add_parser('location_cal', help="row-wise vs vectorized nearest-amenity search")
+    locate.add_argument('--size', type=int, default=2000, help="number of synthetic amenities")
+    locate.add_argument('--queries', type=int, default=20, help="number of locations checked for equality")
+    locate.set_defaults(func=bench_location_cal)
+
+    spatial = subparsers.add_parser('index', help="vectorized scan vs spatial index")
+    spatial.add_argument('--size', type=int, default=100_000, help="number of synthetic amenities")
+    spatial.add_argument('--queries', type=int, default=20, help="number of locations checked for equality")
+    spatial.add_argument('--radius', type=float, default=0.5, help="radius query in km")
+    spatial.set_defaults(func=bench_index)
+
+    xlsx = subparsers.add_parser('xlsx', help="original vs streaming toilet sheet parser")
+    xlsx.add_argument('--file', help="berliner-toiletten-standorte.xlsx to parse, synthetic by default")
+    xlsx.add_argument('--size', type=int, default=5000, help="number of rows in the synthetic sheet")
+    xlsx.set_defaults(func=bench_xlsx)
+
+    kmz = subparsers.add_parser('kmz', help="kml2geojson vs streaming fountain parser")
+    kmz.add_argument('--file', help="Trinkbrunnen KMZ to parse, synthetic by default")
+    kmz.add_argument('--size', type=int, default=5000, help="number of Placemarks in the synthetic KMZ")
+    kmz.set_defaults(func=bench_kmz)
+
+    cache = subparsers.add_parser('cache', help="location_cal with the per-cell result cache on hotspot queries")
+    cache.add_argument('--size', type=int, default=2000, help="number of synthetic amenities")
+    cache.add_argument('--queries', type=int, default=20_000, help="number of hotspot queries")
+    cache.add_argument('--entries', type=int, default=4096, help="NearestCache capacity")
+    cache.set_defaults(func=bench_cache)
+
+    grid = subparsers.add_parser('grid', help="precomputed GridTable vs on-the-fly search, p50/p99 and memory")
+    grid.add_argument('--size', type=int, default=2000, help="number of synthetic amenities")
+    grid.add_argument('--queries', type=int, default=20_000, help="number of uniformly random queries")
+    grid.add_argument('--cell', type=float, default=100.0, help="cell size in m")
+    grid.add_argument('--shards', type=int, default=1, help="processes building the table")
+    grid.set_defaults(func=bench_grid)
+
+    callback = subparsers.add_parser('callback', help="callback payload round trip and fuzzing")
+    callback.add_argument('--fuzz', type=int, default=100_000, help="number of fuzzed payloads")
+    callback.set_defaults(func=bench_callback)
+
+    shared = subparsers.add_parser('shared', help="per-worker memory of shared vs per-process snapshots")
+    shared.add_argument('--size', type=int, default=200_000, help="number of synthetic amenities")
+    shared.add_argument('--workers', type=int, default=4, help="worker processes attached at the same time")
+    shared.add_argument('--queries', type=int, default=5000, help="location_cal queries per worker")
+    shared.set_defaults(func=bench_shared)
+
+    route = subparsers.add_parser('routes', help="route-aware demonstrations on a synthetic street gazetteer")
+    route.add_argument('--size', type=int, default=800, help="number of rows in the synthetic police page")
+    route.add_argument('--chains', type=int, default=300, help="routes of connected streets in the synthetic OSM file")
+    route.add_argument('--queries', type=int, default=5000, help="number of uniformly random queries")
+    route.set_defaults(func=bench_routes)
+
+    suite = subparsers.add_parser('suite', help="every stage at several dataset scales, compared to a baseline")
+    suite.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100],
+                       help="sizes of the synthetic lists relative to the real ones, up to 1000")
+    suite.add_argument('--fixtures', help="directory of responses recorded by record_responses to replay as well")
+    suite.add_argument('--rounds', type=int, default=5, help="loads and snapshot builds per list")
+    suite.add_argument('--queries', type=int, default=2000, help="location_cal queries per list")
+    suite.add_argument('--updates', type=int, default=1000, help="fake updates, half locations and half button presses")
+    suite.add_argument('--save', help="write the results as a baseline JSON")
+    suite.add_argument('--baseline', help="baseline JSON to compare against; exits with 1 on regressions")
+    suite.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown relative to the baseline")
+    suite.set_defaults(func=bench_suite)
+
+    webhook = subparsers.add_parser('webhook', help="load test the webhook server against a stubbed Bot API")
+    webhook.add_argument('--updates', type=int, default=2000, help="number of synthetic updates to post")
+    webhook.add_argument('--clients', type=int, default=32, help="concurrent connections posting updates")
+    webhook.add_argument('--concurrent', type=int, default=16, help="CONCURRENT_UPDATES of the bot")
+    webhook.add_argument('--scale', type=float, default=1.0, help="size of the lists relative to the real ones")
+    webhook.add_argument('--port', type=int, default=8787, help="webhook port; the stub API uses the next one")
+    webhook.set_defaults(func=bench_webhook)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,52 +2,287 @@
 __author__      = "Jan Kopankiewicz"
 
 
-import requests
-from openpyxl import load_workbook
+import httpx
 import pandas as pd
-import kml2geojson
-from bs4 import BeautifulSoup
+import numpy as np
+from scipy.spatial import cKDTree
+from bs4 import BeautifulSoup, SoupStrainer
 from zipfile import ZipFile
+from urllib.parse import urljoin, urlparse
+import uvicorn
+from xml.etree import ElementTree
+import io
 import os
+import re
+import bz2
+import gzip
+import mmap
+import socket
+import json
+import pickle
+import threading
+import itertools
+import struct
+import sys
+import bisect
+import base64
+import time
+from collections import OrderedDict
+import hashlib
+import hmac
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
 import logging
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
 TOKEN = "YOUR-BOT-TOKEN"
+TELEGRAM_API_URL = "https://api.telegram.org/bot"
+# Updates processed at the same time, so one slow callback doesn't hold up everyone else
+CONCURRENT_UPDATES = 16
+# Set WEBHOOK_URL to the public https URL Telegram should post updates to, to receive them
+# on the in-process webhook server listening on WEBHOOK_LISTEN instead of polling.
+# WEBHOOK_SECRET is required then: Telegram sends it with every update, and posts without
+# it are rejected. Bodies above MAX_UPDATE_BYTES are rejected as well.
+WEBHOOK_URL = ""
+WEBHOOK_LISTEN = ("127.0.0.1", 8080)
+WEBHOOK_SECRET = ""
+MAX_UPDATE_BYTES = 1 << 20
+# Telegram user ids allowed to use /stats. METRICS_ENDPOINT also serves the stage timings
+# in Prometheus text format at /metrics on the webhook server.
+ADMIN_IDS = set()
+METRICS_ENDPOINT = False
+# Seconds between stack samples of the event loop thread while /stats profile is on
+PROFILE_INTERVAL = 0.005
+# Seconds between background refreshes of each list. Demos are listed per day and change
+# often, the toilet and fountain lists rarely.
+REFRESH_INTERVALS = {"demo": 15 * 60, "wc": 12 * 60 * 60, "water": 12 * 60 * 60}
+# A list that could not be loaded at all is retried after RETRY_DELAY seconds, doubling up
+# to its refresh interval, instead of waiting a whole interval
+RETRY_DELAY = 30
+# Optional: precompute the nearest candidates of every ~100 m cell over Berlin at refresh
+# time (GridTable), built in GRID_TABLE_SHARDS processes, for constant-time queries
+GRID_TABLE = False
+GRID_TABLE_SHARDS = 1
+# Optional: share nearest candidates between queries from the same ~50 m cell (NearestCache).
+# A miss re-ranks a wider candidate set and costs about 1.7x a plain index search, so this
+# only pays off when most queries come from a few hotspots (hit rates well above 60%)
+NEAREST_CACHE = False
+# Parsed lists and their indexes are kept here so a restart can answer right away.
+# Bump CACHE_SCHEMA whenever the cached layout or the loaders' output changes.
+CACHE_DIR = "cache"
+CACHE_SCHEMA = 7
+# Set WORKERS above 1 to serve the webhook from several processes sharing WEBHOOK_LISTEN.
+# A single refresher process then downloads the lists and publishes each snapshot to
+# SHARED_DIR, preferably a directory on tmpfs such as /dev/shm/amenities, where the workers
+# memory-map it. It is created private to the bot's user, and one owned by another user or
+# writable by others is refused.
+WORKERS = 1
+SHARED_DIR = os.path.join(CACHE_DIR, "shared")
+SHARED_SCHEMA = 4
+# "Update Lists" in a worker asks the refresher for a refresh through SHARED_DIR; the refresher
+# looks for requests every REFRESH_POLL seconds and the worker waits up to REFRESH_WAIT for it
+REFRESH_POLL = 1.0
+REFRESH_WAIT = 60.0
+EARTH_RADIUS_KM = 6371
+# Berlin street gazetteer for placing demonstrations along their route, built once from an
+# OpenStreetMap XML export such as Geofabrik's berlin-latest.osm.bz2 with
+#   python publicAmenitiesBerlinTelegramBot.py gazetteer berlin-latest.osm.bz2
+# Without it demonstrations are placed at their PLZ centroid.
+STREET_GAZETTEER = "berlin-streets.npz"
+# Streets of a route further apart than this are taken to be namesakes in another district
+ROUTE_SPREAD_KM = 3.0
+# Route segments are split to at most this length so the segment index stays tight
+ROUTE_SEGMENT_KM = 0.2
+
+# ETag, Last-Modified and payload hash of the last response per source
+validators = {}
+# Validators fetched while loading one list. They only replace the ones above once that
+# list's snapshot is published, so a load that fails halfway can't mark a source as seen.
+fetched_validators = contextvars.ContextVar('fetched_validators', default=None)
+
+def validator_headers(key):
+    previous = validators.get(key, {})
+    headers = {}
+    if previous.get('etag'):
+        headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        headers['If-Modified-Since'] = previous['last_modified']
+    return headers
+
+def remember_validators(key, response, digest):
+    """Store the validators of a response and return whether its payload changed since last time.
+    While a list is loading, the validators of a changed payload are only collected in
+    fetched_validators."""
+    changed = validators.get(key, {}).get('sha256') != digest
+    entry = {'etag': response.headers.get('ETag'),
+             'last_modified': response.headers.get('Last-Modified'),
+             'sha256': digest}
+    pending = fetched_validators.get()
+    if pending is not None:
+        pending[key] = entry
+    if pending is None or not changed:
+        validators[key] = entry
+    return changed
+
+class SourceClient:
+    """Async HTTP client shared by all list sources. Connections are kept alive per host,
+    at most max_concurrency requests run at once, every request has a timeout, and
+    connection errors, 429s and 5xx responses are retried with exponential backoff.
+    Bodies are streamed and hashed as they arrive. Pass an httpx transport, such as a
+    ReplayTransport, to serve recorded responses instead of the live sites."""
+
+    def __init__(self, transport=None, max_concurrency=4, timeout=30.0, retries=3, backoff=1.0):
+        self.client = httpx.AsyncClient(transport=transport, timeout=timeout, follow_redirects=True,
+                                        limits=httpx.Limits(max_connections=max_concurrency,
+                                                            max_keepalive_connections=max_concurrency))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+
+    async def fetch(self, url, conditional=False, key=None):
+        """Return the body of url, or None when conditional and the source answers 304 Not
+        Modified or sends the same payload as last time. Validators are stored under key,
+        which defaults to url."""
+        key = key or url
+        headers = validator_headers(key) if conditional else {}
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.semaphore, self.client.stream('GET', url, headers=headers) as response:
+                    if response.status_code == 304:
+                        return None
+                    response.raise_for_status()
+                    sha256, chunks = hashlib.sha256(), []
+                    async for chunk in response.aiter_bytes():
+                        sha256.update(chunk)
+                        chunks.append(chunk)
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as error:
+                retryable = not isinstance(error, httpx.HTTPStatusError) or \
+                    error.response.status_code == 429 or error.response.status_code >= 500
+                if not retryable or attempt == self.retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                logger.warning("Fetching %s failed (%r), retrying in %.1fs", url, error, delay)
+                await asyncio.sleep(delay)
+        if not remember_validators(key, response, sha256.hexdigest()) and conditional:
+            return None
+        return b''.join(chunks)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves responses recorded in a directory instead of the network: index.json maps each
+    URL to the file holding its body plus its status and headers. Conditional requests get
+    a 304 when they match the recorded ETag, and unknown URLs get a 404."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'index.json')) as file:
+            self.recordings = json.load(file)
+
+    async def handle_async_request(self, request):
+        recording = self.recordings.get(str(request.url))
+        if recording is None:
+            return httpx.Response(404, request=request)
+        headers = recording.get('headers', {})
+        if 'ETag' in headers and request.headers.get('If-None-Match') == headers['ETag']:
+            return httpx.Response(304, headers=headers, request=request)
+        with open(os.path.join(self.directory, recording['file']), 'rb') as file:
+            content = file.read()
+        return httpx.Response(recording.get('status', 200), headers=headers, content=content, request=request)
+
+def record_responses(urls, directory):
+    """Download urls into directory in the layout ReplayTransport reads."""
+    os.makedirs(directory, exist_ok=True)
+    recordings = {}
+    with httpx.Client(follow_redirects=True, timeout=60) as client:
+        for i, url in enumerate(urls):
+            response = client.get(url)
+            response.raise_for_status()
+            filename = f"{i:02d}-{os.path.basename(url.rstrip('/')) or 'index'}"
+            with open(os.path.join(directory, filename), 'wb') as file:
+                file.write(response.content)
+            headers = {name: response.headers[name] for name in ('ETag', 'Last-Modified', 'Content-Type')
+                       if name in response.headers}
+            recordings[url] = {'file': filename, 'status': response.status_code, 'headers': headers}
+    with open(os.path.join(directory, 'index.json'), 'w') as file:
+        json.dump(recordings, file, indent=1)
+    return recordings
 
-def download_file(url):
-    filename = os.path.basename(url)
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(filename, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-        print(f"File '{filename}' has been successfully downloaded.")
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while downloading the file: {e}")
-    except IOError as e:
-        print(f"An error occurred while writing the file: {e}")
 def convert_to_float(value):
     if isinstance(value, str):
         return float(value.replace(',', '.'))
     return value
 
-def get_visible_rows(filename, sheet_name):
-    wb = load_workbook(filename)
-    sheet = wb[sheet_name]
-    return [row - 1 for row in range(1, sheet.max_row + 1) if not sheet.row_dimensions[row].hidden]
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+def column_number(cell_reference):
+    """Return the zero-based column of a cell reference such as 'AB12'."""
+    number = 0
+    for char in cell_reference:
+        if not char.isalpha():
+            break
+        number = number * 26 + ord(char.upper()) - 64
+    return number - 1
 
-def find_header_row(df, header_column='Bezirk'):
-    header_row = df.index[df.iloc[:, 0] == header_column].tolist()
-    return header_row[0] if header_row else None
+def worksheet_path(xlsx, sheet_name):
+    workbook = ElementTree.fromstring(xlsx.read('xl/workbook.xml'))
+    relations = ElementTree.fromstring(xlsx.read('xl/_rels/workbook.xml.rels'))
+    for sheet in workbook.iter(f'{XLSX_NS}sheet'):
+        if sheet.get('name') == sheet_name:
+            relation_id = sheet.get(f'{XLSX_REL_NS}id')
+            target = next(rel.get('Target') for rel in relations if rel.get('Id') == relation_id)
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    raise KeyError(f"Worksheet '{sheet_name}' does not exist")
+
+def cell_value(cell, shared_strings):
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(text.text or '' for text in cell.iter(f'{XLSX_NS}t'))
+    value = cell.findtext(f'{XLSX_NS}v')
+    if value is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value)]
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type in ('str', 'e'):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() and 'E' not in value.upper() and '.' not in value else number
+
+def iter_visible_rows(source, sheet_name):
+    """Stream the cell values of the visible rows of a worksheet straight from the XLSX's
+    XML in a single pass, clearing every row once it has been read."""
+    with ZipFile(source) as xlsx:
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in xlsx.namelist():
+            for _, item in ElementTree.iterparse(xlsx.open('xl/sharedStrings.xml')):
+                if item.tag == f'{XLSX_NS}si':
+                    shared_strings.append(''.join(text.text or '' for text in item.iter(f'{XLSX_NS}t')))
+                    item.clear()
+        for _, row in ElementTree.iterparse(xlsx.open(worksheet_path(xlsx, sheet_name))):
+            if row.tag != f'{XLSX_NS}row':
+                continue
+            if row.get('hidden') not in ('1', 'true'):
+                values = []
+                for cell in row.iter(f'{XLSX_NS}c'):
+                    column = column_number(cell.get('r')) if cell.get('r') else len(values)
+                    values.extend([None] * (column - len(values)))
+                    values.append(cell_value(cell, shared_strings))
+                yield values
+            row.clear()
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate the great circle distance between two points on the earth."""
     from math import radians, sin, cos, sqrt, atan2
-    R = 6371  # Earth radius in km
+    R = EARTH_RADIUS_KM
     lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
     dlat = lat2 - lat1
     dlon = lon2 - lon1
@@ -56,101 +291,871 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * atan2(sqrt(a), sqrt(1-a))
     
     return round(R * c, 2)
-def location_cal(df: pd.DataFrame, my_location: tuple[float, float]) -> pd.DataFrame:
-    """Calculate distances from a given location to all locations in the DataFrame,
-    then return the top 5 closest locations."""
-    df['Distance'] = df.apply(lambda row: haversine_distance(my_location[0], my_location[1], 
-                                                             row.Breitengrad, row.Laengengrad), axis=1)
-    return df.nsmallest(5, 'Distance')
+def radian_coordinates(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Return the Breitengrad/Laengengrad columns as contiguous float64 radian arrays.
+    Missing or unparsable coordinates become NaN and are never returned as a match."""
+    lat = pd.to_numeric(df['Breitengrad'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['Laengengrad'], errors='coerce').to_numpy(dtype=np.float64)
+    return np.ascontiguousarray(np.radians(lat)), np.ascontiguousarray(np.radians(lon))
+
+def nearest_amenities(lat_rad: np.ndarray, lon_rad: np.ndarray, my_location: tuple[float, float],
+                      k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized haversine_distance against all points, returning the positions and
+    distances in km of the k closest points, closest first (ties keep row order)."""
+    lat1, lon1 = np.radians(my_location[0]), np.radians(my_location[1])
+    a = np.sin((lat_rad - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat_rad) * np.sin((lon_rad - lon1) / 2)**2
+    distances = np.round(2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), 2)
+
+    valid = np.count_nonzero(~np.isnan(distances))
+    k = min(k, valid)
+    if k == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+    # argpartition finds the k-th smallest distance in O(n); every row at or below it is a
+    # candidate, so ties on the boundary are resolved by row order just like nsmallest.
+    kth = distances[np.argpartition(distances, k - 1)[k - 1]]
+    candidates = np.flatnonzero(distances <= kth)
+    candidates = candidates[np.argsort(distances[candidates], kind='stable')][:k]
+    return candidates, distances[candidates]
+
+def unit_vectors(lat_rad: np.ndarray, lon_rad: np.ndarray) -> np.ndarray:
+    """Return points on the unit sphere, where straight-line (chord) distance grows
+    monotonically with great-circle distance."""
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+def chord_length(distance_km):
+    return 2 * np.sin(np.minimum(distance_km / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+def frozen(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+class AmenityIndex:
+    """KD-tree over the 3D unit-sphere coordinates of a list's rows, built once per
+    data refresh. Rows without coordinates are left out of the tree. Results are the
+    row positions and haversine distances in km, identical to nearest_amenities."""
+
+    def __init__(self, lat_rad: np.ndarray, lon_rad: np.ndarray, tree: cKDTree | None = None):
+        self.lat_rad, self.lon_rad = frozen(lat_rad), frozen(lon_rad)
+        self.positions = frozen(np.flatnonzero(~(np.isnan(lat_rad) | np.isnan(lon_rad))))
+        if tree is None:
+            tree = cKDTree(unit_vectors(lat_rad[self.positions], lon_rad[self.positions]))
+        self.tree = tree
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _query_point(self, my_location: tuple[float, float]) -> np.ndarray:
+        return unit_vectors(*np.radians([[my_location[0]], [my_location[1]]]))[0]
+
+    def _rows(self, candidates: list[int]) -> np.ndarray:
+        return self.positions[np.sort(np.asarray(candidates, dtype=np.intp))]
+
+    def rank(self, my_location: tuple[float, float], positions: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the k closest of the given row positions, which must be in ascending order."""
+        best, distances = nearest_amenities(self.lat_rad[positions], self.lon_rad[positions], my_location, k)
+        return positions[best], distances
+
+    def candidates(self, my_location: tuple[float, float], k: int, margin_km: float = 0.0) -> np.ndarray:
+        """Return the row positions, in ascending order, that can be among the k closest rows
+        of any point within margin_km of my_location."""
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+        point = self._query_point(my_location)
+        chords, _ = self.tree.query(point, k=[k])
+        # Moving margin_km away brings the k-th neighbour at most margin_km closer and any other
+        # row at most margin_km closer too. Distances are rounded to 10 m, so widen by that much
+        # as well: rows tied with the k-th after rounding are then resolved by row order.
+        kth_km = 2 * EARTH_RADIUS_KM * np.arcsin(min(chords[-1] / 2, 1.0))
+        return self._rows(self.tree.query_ball_point(point, chord_length(kth_km + 2 * margin_km + 0.01)))
+
+    def nearest(self, my_location: tuple[float, float], k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """Return the k closest rows in O(log n)."""
+        return self.rank(my_location, self.candidates(my_location, k), k)
+
+    def within(self, my_location: tuple[float, float], radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Return all rows within radius_km, closest first."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+        # Widened by the 10 m rounding so rows that round down onto the radius are kept
+        candidates = self._rows(self.tree.query_ball_point(self._query_point(my_location), chord_length(radius_km + 0.01)))
+        positions, distances = self.rank(my_location, candidates, len(candidates))
+        inside = distances <= radius_km
+        return positions[inside], distances[inside]
+
+class ScanIndex(AmenityIndex):
+    """AmenityIndex without a KD-tree, answering by vectorized scans over the coordinates
+    instead, so that they can be read straight from a memory-mapped snapshot."""
+
+    def __init__(self, lat_rad: np.ndarray, lon_rad: np.ndarray, positions: np.ndarray):
+        self.lat_rad, self.lon_rad, self.positions = lat_rad, lon_rad, positions
+        self.tree = None
+
+    def _distances(self, my_location: tuple[float, float]) -> np.ndarray:
+        """Unrounded great-circle distances in km to the rows with coordinates."""
+        lat1, lon1 = np.radians(my_location[0]), np.radians(my_location[1])
+        lat_rad, lon_rad = self.lat_rad[self.positions], self.lon_rad[self.positions]
+        a = np.sin((lat_rad - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat_rad) * np.sin((lon_rad - lon1) / 2)**2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def candidates(self, my_location: tuple[float, float], k: int, margin_km: float = 0.0) -> np.ndarray:
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+        distances = self._distances(my_location)
+        kth_km = np.partition(distances, k - 1)[k - 1]
+        return self.positions[distances <= kth_km + 2 * margin_km + 0.01]
+
+    def within(self, my_location: tuple[float, float], radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        candidates = self.positions[self._distances(my_location) <= radius_km + 0.01]
+        positions, distances = self.rank(my_location, candidates, len(candidates))
+        inside = distances <= radius_km
+        return positions[inside], distances[inside]
+
+# KD-tree of a sharded GridTable build, built once per worker process by grid_shard_init
+grid_shard_index = None
+
+def grid_shard_init(lat_rad, lon_rad):
+    global grid_shard_index
+    grid_shard_index = AmenityIndex(lat_rad, lon_rad)
+
+def grid_shard_worker(k, grid, rows):
+    return grid_shard_candidates(grid_shard_index, k, grid, rows)
+
+def grid_shard_candidates(index, k, grid, rows):
+    """Return the CSR lengths and row positions of the candidates of the given rows of a
+    GridTable's cells. Runs in a worker process, through grid_shard_worker, when the build is sharded."""
+    (lat_min, lon_min, step_lat, step_lon, n_lat, n_lon), margin_km = grid
+    k = min(k, len(index))
+    if k == 0:
+        return np.zeros(len(rows) * n_lon, dtype=np.int64), np.empty(0, dtype=np.int32)
+    cell_lats, cell_lons = np.meshgrid(lat_min + (np.asarray(rows) + 0.5) * step_lat,
+                                       lon_min + (np.arange(n_lon) + 0.5) * step_lon, indexing='ij')
+    points = unit_vectors(np.radians(cell_lats.ravel()), np.radians(cell_lons.ravel()))
+    chords, _ = index.tree.query(points, k=[k])
+    kth_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords[:, -1] / 2, 1.0))
+    neighbours = index.tree.query_ball_point(points, chord_length(kth_km + 2 * margin_km + 0.01), return_sorted=True)
+    lengths = np.fromiter((len(cell) for cell in neighbours), dtype=np.int64, count=len(neighbours))
+    flat = np.fromiter(itertools.chain.from_iterable(neighbours), dtype=np.int64, count=int(lengths.sum()))
+    return lengths, index.positions[flat].astype(np.int32)
+
+class GridTable:
+    """Candidate rows for the k nearest of every cell of a fixed grid over Berlin, precomputed
+    at refresh time so a query only re-ranks the handful of rows of its cell. Stored in CSR
+    form: the candidates of cell c are positions[offsets[c]:offsets[c + 1]], in ascending
+    order. Building can be sharded across processes by rows of cells."""
+
+    # Covers every centroid in plz_map with a margin of a few km
+    BOUNDS = (52.33, 52.69, 13.05, 13.81)
+
+    def __init__(self, index: AmenityIndex, k: int = 5, cell_m: float = 100.0, shards: int = 1):
+        lat_min, lat_max, lon_min, lon_max = self.BOUNDS
+        self.k = k
+        self.lat_min, self.lon_min = lat_min, lon_min
+        self.step_lat = cell_m / 1000 / (np.pi / 180 * EARTH_RADIUS_KM)
+        self.step_lon = self.step_lat / np.cos(np.radians(lat_max))
+        self.n_lat = int(np.ceil((lat_max - lat_min) / self.step_lat))
+        self.n_lon = int(np.ceil((lon_max - lon_min) / self.step_lon))
+        margin_km = 0.5 * np.hypot(self.step_lat, self.step_lon) * np.pi / 180 * EARTH_RADIUS_KM
+        grid = ((lat_min, lon_min, self.step_lat, self.step_lon, self.n_lat, self.n_lon), margin_km)
+
+        # Blocks of 32 rows of cells keep the intermediate neighbour lists small
+        row_shards = np.array_split(np.arange(self.n_lat), max(shards, -(-self.n_lat // 32)))
+        if shards > 1:
+            with ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=grid_shard_init,
+                                     initargs=(np.asarray(index.lat_rad), np.asarray(index.lon_rad))) as pool:
+                parts = list(pool.map(grid_shard_worker, *zip(*[(k, grid, rows) for rows in row_shards])))
+        else:
+            parts = [grid_shard_candidates(index, k, grid, rows) for rows in row_shards]
+        self.offsets = frozen(np.concatenate(([0], np.cumsum(np.concatenate([part[0] for part in parts])))))
+        self.positions = frozen(np.concatenate([part[1] for part in parts]))
+
+    PARAMETERS = ('k', 'lat_min', 'lon_min', 'step_lat', 'step_lon', 'n_lat', 'n_lon')
+
+    @classmethod
+    def attach(cls, parameters: dict, offsets: np.ndarray, positions: np.ndarray) -> 'GridTable':
+        """Return a table over already computed CSR arrays, such as memory-mapped ones."""
+        table = cls.__new__(cls)
+        for name in cls.PARAMETERS:
+            setattr(table, name, parameters[name])
+        table.offsets, table.positions = offsets, positions
+        return table
+
+    def parameters(self) -> dict:
+        return {name: getattr(self, name).item() if isinstance(getattr(self, name), np.generic) else getattr(self, name)
+                for name in self.PARAMETERS}
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.positions.nbytes
+
+    def candidates(self, my_location: tuple[float, float], k: int) -> np.ndarray | None:
+        """Return the candidate rows of the location's cell, or None outside the grid or for k above the table's."""
+        row = int((my_location[0] - self.lat_min) // self.step_lat)
+        column = int((my_location[1] - self.lon_min) // self.step_lon)
+        if k > self.k or not (0 <= row < self.n_lat and 0 <= column < self.n_lon):
+            return None
+        cell = row * self.n_lon + column
+        return self.positions[self.offsets[cell]:self.offsets[cell + 1]]
+
+# Origin of the local projection used for route geometry: x east and y north in km,
+# accurate to well under 1% across Berlin
+ROUTE_ORIGIN = (52.52, 13.40)
+
+def project(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Return degrees as (n, 2) km offsets from ROUTE_ORIGIN."""
+    scale = np.pi / 180 * EARTH_RADIUS_KM
+    return np.column_stack(((np.asarray(lon) - ROUTE_ORIGIN[1]) * scale * np.cos(np.radians(ROUTE_ORIGIN[0])),
+                            (np.asarray(lat) - ROUTE_ORIGIN[0]) * scale))
+
+def segment_distances(point: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """Vectorized distance in km from a projected point to each (x0, y0, x1, y1) segment."""
+    start, delta = segments[:, :2], segments[:, 2:] - segments[:, :2]
+    length2 = np.einsum('ij,ij->i', delta, delta)
+    t = np.clip(np.einsum('ij,ij->i', point - start, delta) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    return np.hypot(*(start + t[:, None] * delta - point).T)
+
+class RouteIndex:
+    """KD-tree over the midpoints of the route segments of every row, for the rows closest
+    to a location by distance to any point of their route. Segments are at most
+    ROUTE_SEGMENT_KM long, so every segment closer than d has its midpoint within
+    d + ROUTE_SEGMENT_KM / 2, which bounds the segments that have to be measured."""
+
+    def __init__(self, segments: np.ndarray, rows: np.ndarray):
+        self.segments, self.rows = segments, rows
+        lengths = np.hypot(*(segments[:, 2:] - segments[:, :2]).T)
+        self.half_length = float(lengths.max(initial=0.0)) / 2
+        self.tree = cKDTree((segments[:, :2] + segments[:, 2:]) / 2)
+        self.row_count = len(np.unique(rows))
+
+    @classmethod
+    def from_routes(cls, routes, lat: np.ndarray, lon: np.ndarray) -> 'RouteIndex':
+        """Build from flat route arrays as made by route_polyline; rows without a route
+        become a single point at their coordinates, rows with neither are left out."""
+        segments, rows = [], []
+        for row, route in enumerate(routes):
+            points = np.asarray(route, dtype=np.float64).reshape(-1, 2)
+            if len(points) == 0:
+                if np.isnan(lat[row]) or np.isnan(lon[row]):
+                    continue
+                points = np.array([[lat[row], lon[row]]])
+            xy = project(points[:, 0], points[:, 1])
+            if len(xy) == 1:
+                pairs = np.hstack((xy, xy))
+            else:
+                # NaN points separate the streets of a route; pairs touching one are dropped
+                pairs = np.hstack((xy[:-1], xy[1:]))
+                pairs = pairs[~np.isnan(pairs).any(axis=1)]
+            segments.append(pairs)
+            rows.append(np.full(len(pairs), row, dtype=np.int64))
+        segments = np.concatenate(segments) if segments else np.empty((0, 4))
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        # Split long segments into equal pieces of at most ROUTE_SEGMENT_KM
+        pieces = np.maximum(1, np.ceil(np.hypot(*(segments[:, 2:] - segments[:, :2]).T) / ROUTE_SEGMENT_KM)).astype(np.int64)
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        step = np.arange(pieces.sum()) - first
+        owner = np.repeat(np.arange(len(segments)), pieces)
+        start, delta = segments[owner, :2], (segments[owner, 2:] - segments[owner, :2]) / pieces[owner, None]
+        split = np.hstack((start + step[:, None] * delta, start + (step[:, None] + 1) * delta))
+        return cls(frozen(split), frozen(rows[owner]))
+
+    def _row_minimum(self, point: np.ndarray, candidates) -> tuple[np.ndarray, np.ndarray]:
+        """Return the rows of the candidate segments and each row's smallest distance."""
+        candidates = np.asarray(candidates, dtype=np.intp)
+        distances = segment_distances(point, self.segments[candidates])
+        rows = self.rows[candidates]
+        order = np.lexsort((distances, rows))
+        rows, distances = rows[order], distances[order]
+        first = np.concatenate(([True], rows[1:] != rows[:-1]))
+        return rows[first], distances[first]
+
+    def nearest(self, my_location: tuple[float, float], k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """Return the k rows whose route passes closest, closest first (ties keep row order),
+        with their distance in km rounded like haversine_distance."""
+        k = min(k, self.row_count)
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+        point = project([my_location[0]], [my_location[1]])[0]
+        # Measure growing sets of the nearest segments until they cover k rows; the k-th
+        # row distance found then bounds the distance of every row that can still win
+        count = min(len(self.segments), 8 * k)
+        while True:
+            _, candidates = self.tree.query(point, k=[*range(1, count + 1)])
+            rows, distances = self._row_minimum(point, candidates)
+            if len(rows) >= k or count == len(self.segments):
+                break
+            count = min(len(self.segments), 4 * count)
+        bound = np.partition(distances, k - 1)[k - 1]
+        rows, distances = self._row_minimum(point, self.tree.query_ball_point(point, bound + self.half_length + 0.01))
+        distances = np.round(distances, 2)
+        best = np.lexsort((rows, distances))[:k]
+        return rows[best].astype(np.intp), distances[best]
+
+def content_version(columns: dict) -> int:
+    """Return the first 32 bits of a sha256 over the column names and values, never 0, which
+    marks a list that isn't loaded. Derived from the contents, the version of a list is the
+    same in every process and after a restart, and changes only when the list does."""
+    digest = hashlib.sha256()
+    for name, values in columns.items():
+        # A fixed protocol keeps the bytes the same wherever the version is computed
+        digest.update(pickle.dumps((name, [value.tolist() if isinstance(value, np.ndarray) else value
+                                           for value in values]), protocol=4))
+    return int.from_bytes(digest.digest()[:4], 'big') or 1
+
+class AmenitySnapshot:
+    """Read-only snapshot of one amenity list: a frozen array per column plus the
+    AmenityIndex over its coordinates. Queries only read from it, so it can be shared by
+    concurrent callbacks and is simply replaced, never modified, when the list is updated.
+    Lists with a 'Route' column, the demonstrations, also get a RouteIndex over the routes.
+    With GRID_TABLE on the others get a GridTable, unless an already computed one is given.
+    The version goes into callback payloads; a cached snapshot is given the one it was saved
+    with, since the cache may store values of mixed columns as text."""
+
+    def __init__(self, df: pd.DataFrame, index: AmenityIndex | None = None, grid: GridTable | None = None,
+                 version: int | None = None):
+        # Validators of the responses the snapshot was parsed from, set by load_snapshot
+        self.validators = {}
+        self.columns = {name: frozen(df[name].to_numpy(dtype=object, copy=True)) for name in df.columns}
+        self.version = content_version(self.columns) if version is None else version
+        self.index = AmenityIndex(*radian_coordinates(df)) if index is None else index
+        self.routes = None
+        if 'Route' in df.columns and any(len(route) for route in df['Route']):
+            self.routes = RouteIndex.from_routes(df['Route'], np.degrees(self.index.lat_rad), np.degrees(self.index.lon_rad))
+        self.grid = None
+        if GRID_TABLE and self.routes is None:
+            self.grid = grid if grid is not None else GridTable(self.index, shards=GRID_TABLE_SHARDS)
+
+    def __len__(self) -> int:
+        return len(self.index.lat_rad)
+
+    def rows(self, positions: np.ndarray) -> list[dict]:
+        return [{name: values[p] for name, values in self.columns.items()} for p in positions]
+
+class NearestCache:
+    """Bounded LRU of nearest-row candidates per grid cell of roughly 50 m, keyed by
+    (snapshot version, k, cell). Versions are derived from the lists' contents, so a key
+    names the exact rows its candidates were taken from. An entry holds every row that can be among the
+    k closest for some point in its cell, so re-ranking them gives exactly the result of a
+    full search. Entries expire after ttl seconds and are dropped when a refresh replaces
+    their snapshot."""
+
+    # Cell size in degrees: about 50 m north-south, and east-west at Berlin's latitude
+    LAT_STEP = 0.00045
+    LON_STEP = 0.00075
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        # Half the cell's diagonal, overestimated by measuring longitude like latitude
+        self.margin_km = 0.5 * np.hypot(self.LAT_STEP, self.LON_STEP) * np.pi / 180 * EARTH_RADIUS_KM
+
+    def candidates(self, snapshot: AmenitySnapshot, my_location: tuple[float, float], k: int) -> np.ndarray:
+        cell = (int(my_location[0] // self.LAT_STEP), int(my_location[1] // self.LON_STEP))
+        key = (snapshot.version, k, cell)
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[0] <= self.ttl:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+        if entry is not None:
+            self.expirations += 1
+        self.misses += 1
+        center = ((cell[0] + 0.5) * self.LAT_STEP, (cell[1] + 0.5) * self.LON_STEP)
+        positions = frozen(snapshot.index.candidates(center, k, self.margin_km))
+        self.entries[key] = (now, positions)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return positions
+
+    def retain(self, versions) -> None:
+        """Drop the entries of snapshots whose version is not in versions."""
+        versions = set(versions)
+        for key in [key for key in self.entries if key[0] not in versions]:
+            del self.entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'expirations': self.expirations}
+
+nearest_cache = NearestCache()
+
+class LatencyHistogram:
+    """Counts of durations in exponential buckets from 10 us to about 40 s, cheap enough to
+    record on every update. Percentiles are the upper bound of the bucket they fall in."""
+
+    BOUNDS = tuple(10e-6 * 2**i for i in range(23))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        bucket = bisect.bisect_left(self.BOUNDS, seconds)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def percentile(self, q: float) -> float:
+        """Return the bound below which at least q percent of the durations fall."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        for bound, cumulative in zip(self.BOUNDS + (float('inf'),), itertools.accumulate(self.counts)):
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+# Durations per stage: fetch_<list> and parse_<list> when refreshing, location_cal,
+# keyboard and send when answering
+stage_timings = {}
+
+class timed:
+    """Context manager recording the duration of its block in stage_timings[stage]."""
+
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        histogram = stage_timings.get(self.stage)
+        if histogram is None:
+            histogram = stage_timings.setdefault(self.stage, LatencyHistogram())
+        histogram.observe(time.perf_counter() - self.start)
+
+def stats_text() -> str:
+    lines = ["stage            count   p50 ms   p99 ms  mean ms"]
+    for stage, histogram in sorted(stage_timings.items()):
+        mean = histogram.sum / histogram.count if histogram.count else 0.0
+        lines.append(f"{stage:14s} {histogram.count:7d} {histogram.percentile(50) * 1000:8.2f} "
+                     f"{histogram.percentile(99) * 1000:8.2f} {mean * 1000:8.2f}")
+    cache = nearest_cache.stats()
+    lines.append(f"nearest_cache ({'on' if NEAREST_CACHE else 'off'}): {cache['entries']} entries, hit rate {cache['hit_rate']:.1%}, "
+                 f"{cache['evictions']} evictions, {cache['expirations']} expirations")
+    lines.append("snapshots: " + ", ".join(f"{choice} v{snapshot.version} ({len(snapshot)} rows)"
+                                           for choice, snapshot in sorted(amenities.items())))
+    lines.append(f"profiler: {'on' if profiler.running else 'off'}")
+    return "\n".join(lines)
+
+def prometheus_text() -> str:
+    """Return the stage timings and nearest_cache counters in the Prometheus text format."""
+    lines = ["# HELP amenities_stage_seconds Duration of the bot's stages.",
+             "# TYPE amenities_stage_seconds histogram"]
+    for stage, histogram in sorted(stage_timings.items()):
+        for bound, cumulative in zip(histogram.BOUNDS + (float('inf'),), itertools.accumulate(histogram.counts)):
+            le = "+Inf" if bound == float('inf') else f"{bound:.6g}"
+            lines.append(f'amenities_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'amenities_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.9g}')
+        lines.append(f'amenities_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+    cache = nearest_cache.stats()
+    for name in ('hits', 'misses', 'evictions', 'expirations'):
+        lines += [f"# TYPE amenities_nearest_cache_{name}_total counter",
+                  f"amenities_nearest_cache_{name}_total {cache[name]}"]
+    lines += ["# TYPE amenities_nearest_cache_entries gauge", f"amenities_nearest_cache_entries {cache['entries']}"]
+    return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """Samples the stack of the event loop thread every PROFILE_INTERVAL from a background
+    thread and counts identical stacks, for profiling the live bot at little cost. Off
+    until started; the report is in the collapsed format flame graph tools read."""
+
+    def __init__(self):
+        self.running = False
+        self.stacks = {}
+        self.thread = None
+
+    def start(self, thread_id: int) -> None:
+        self.stacks = {}
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, args=(thread_id,), name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> str:
+        self.running = False
+        self.thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in
+                       sorted(self.stacks.items(), key=lambda item: item[1], reverse=True))
+
+    def sample(self, thread_id: int) -> None:
+        while self.running:
+            frame = sys._current_frames().get(thread_id)
+            names = []
+            while frame is not None:
+                names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            time.sleep(PROFILE_INTERVAL)
+
+profiler = SamplingProfiler()
+
+def location_cal(snapshot: AmenitySnapshot, my_location: tuple[float, float], k: int = 5) -> list[dict]:
+    """Calculate distances from a given location to all locations in the snapshot,
+    then return the top k closest locations as rows with an added 'Distance' in km.
+    Only the k result rows are allocated; the snapshot itself is never written.
+    Candidates come from the snapshot's GridTable when there is one, otherwise from the
+    KD-tree, shared through nearest_cache by queries from the same ~50 m cell when
+    NEAREST_CACHE is on. Lists with routes are ranked by the distance to the closest
+    point of each route instead."""
+    with timed("location_cal"):
+        if snapshot.routes is not None:
+            positions, distances = snapshot.routes.nearest(my_location, k)
+        else:
+            candidates = None if snapshot.grid is None else snapshot.grid.candidates(my_location, k)
+            if candidates is None and NEAREST_CACHE:
+                candidates = nearest_cache.candidates(snapshot, my_location, k)
+            if candidates is None:
+                positions, distances = snapshot.index.nearest(my_location, k)
+            else:
+                positions, distances = snapshot.index.rank(my_location, candidates, k)
+        top = snapshot.rows(positions)
+    for row, distance in zip(top, distances.tolist()):
+        row['Distance'] = distance
+    return top
 
 #Berliner Toiletten
-def update_toilettes():
-    download_file("https://www.berlin.de/sen/uvk/_assets/verkehr/infrastruktur/oeffentliche-toiletten/berliner-toiletten-standorte.xlsx")
-    filename = 'berliner-toiletten-standorte.xlsx'
-    sheet_name = 'Berlinweit'
-    visible_rows = get_visible_rows(filename, sheet_name)
+TOILETTEN_URL = "https://www.berlin.de/sen/uvk/_assets/verkehr/infrastruktur/oeffentliche-toiletten/berliner-toiletten-standorte.xlsx"
 
-    df_temp = pd.read_excel(filename, sheet_name=sheet_name, header=None, 
-                            skiprows=lambda x: x not in visible_rows)
+async def update_toilettes(conditional=False):
+    """Return a DataFrame of the public toilets, or None when conditional and the sheet is unchanged"""
+    with timed("fetch_wc"):
+        content = await http_client().fetch(TOILETTEN_URL, conditional)
+    if content is None:
+        return None
+    with timed("parse_wc"):
+        return await in_refresh_pool(parse_toilettes, io.BytesIO(content))
 
-    header_index = find_header_row(df_temp)
+vertrag_map = {
+    1: "Toilettenvertrag mit Wall",
+    2: "Pilotprojekt Parktoilettenvertrag",
+    3: "Pilottoiletten im Grün/Sonstige öffentliche Toiletten",
+    4: "Privat betriebene öffentliche Toiletten" 
+}
 
-    if header_index is not None:
-        df_wc = pd.read_excel(filename, sheet_name=sheet_name, 
-                            skiprows=lambda x: x not in visible_rows or x < header_index,
-                            header=0)  
-    else:
-        print("Could not find a row starting with 'Bezirk'")
-        df_wc = df_temp 
-
-    vertrag_map = {
-        1: "Toilettenvertrag mit Wall",
-        2: "Pilotprojekt Parktoilettenvertrag",
-        3: "Pilottoiletten im Grün/Sonstige öffentliche Toiletten",
-        4: "Privat betriebene öffentliche Toiletten" 
-    }
-    df_wc['Vertrag'] = pd.to_numeric(df_wc['Vertrag'], errors='coerce')
-    df_wc['Vertrag'] = df_wc['Vertrag'].map(vertrag_map).fillna(df_wc['Vertrag'])
-    df_wc['Breitengrad'] = df_wc['Breitengrad'].apply(convert_to_float)
-    df_wc['Laengengrad'] = df_wc['Laengengrad'].apply(convert_to_float)
-    return df_wc
+def convert_vertrag(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+    return vertrag_map.get(number, number)
+
+def parse_toilettes(source, sheet_name='Berlinweit', header_column='Bezirk'):
+    """Return a DataFrame of the toilets in the sheet, read in one streaming pass: hidden rows
+    are skipped, everything above the row starting with 'Bezirk' is ignored, and the
+    coordinates and Vertrag are converted while the rows are read."""
+    converters = {'Breitengrad': convert_to_float, 'Laengengrad': convert_to_float, 'Vertrag': convert_vertrag}
+    header, columns = None, None
+    for values in iter_visible_rows(source, sheet_name):
+        if header is None:
+            if values and values[0] == header_column:
+                header = []
+                for i, name in enumerate(values):
+                    name = f"Unnamed: {i}" if name is None else str(name)
+                    # Repeated names get a suffix, as pandas does, so no column is lost
+                    header.append(name if name not in header else f"{name}.{header.count(name)}")
+                columns = [[] for _ in header]
+            continue
+        if all(value is None for value in values):
+            continue
+        values.extend([None] * (len(header) - len(values)))
+        for name, column, value in zip(header, columns, values):
+            column.append(converters[name](value) if name in converters else value)
+    if header is None:
+        raise ValueError(f"Could not find a row starting with '{header_column}'")
+    return pd.DataFrame({name: np.array(column, dtype=np.float64) if name in ('Breitengrad', 'Laengengrad') else column
+                         for name, column in zip(header, columns)})
 
 #Berliner Wasser
 
-def update_water():
-    bwb_url = "https://www.bwb.de/de/trinkbrunnen.php"
-    req = requests.get(bwb_url)
-    soup = BeautifulSoup(req.content, 'html.parser')
-    kmz_url = soup.find("a", class_="trinkbrunnen")['href']
-    r = requests.get(kmz_url, allow_redirects=True)
-    open('Trinkbrunnen.kmz', 'wb').write(r.content)
-    # unzip
-    kmz = ZipFile("Trinkbrunnen.kmz", 'r')
-    kml = kmz.open('doc.kml', 'r').read()
-    # save as xml
-    f = open("Trinkbrunnen.xml", "w")
-    f.write(str(kml,'utf-8'))
-    f.close()
-    #convert the xml to more usable json format
-    trinkbrunnen_data = kml2geojson.main.convert("Trinkbrunnen.xml", "leaflet")
-
-    rows_list = []
-    for i in range(len(trinkbrunnen_data[0]["features"])):
-        name=           trinkbrunnen_data[0]["features"][i]["properties"]["name"]
-        description =   trinkbrunnen_data[0]["features"][i]["properties"]["description"]
-        long, lat =     trinkbrunnen_data[0]["features"][i]["geometry"]["coordinates"][0:2]
-        
-        dict1 = {'Name': name, 'Description': description, 'Laengengrad': long, 'Breitengrad': lat}
-        rows_list.append(dict1)
-
-    # create dataframe 
-    return pd.DataFrame.from_dict(rows_list)
-
-def update_police_demo_data():
-    """Return a DataFrame containing the demonstrations or protests listed for today including a rough estimation of where it is happening"""
+BWB_URL = "https://www.bwb.de/de/trinkbrunnen.php"
+
+def find_kmz_url(page):
+    soup = BeautifulSoup(page, 'html.parser')
+    return urljoin(BWB_URL, soup.find("a", class_="trinkbrunnen")['href'])
+
+async def update_water(conditional=False):
+    """Return a DataFrame of the drinking fountains, or None when conditional and the KMZ is unchanged"""
+    with timed("fetch_water"):
+        kmz_url = await in_refresh_pool(find_kmz_url, await http_client().fetch(BWB_URL))
+        content = await http_client().fetch(kmz_url, conditional)
+    if content is None:
+        return None
+    with timed("parse_water"):
+        return await in_refresh_pool(parse_fountains, content)
+
+def grown(array, size):
+    bigger = np.empty(max(2 * len(array), size), dtype=array.dtype)
+    bigger[:len(array)] = array
+    return bigger
+
+def parse_fountains(kmz_content, capacity=4096):
+    """Return a DataFrame of the point Placemarks in a KMZ, read from memory. The KML is
+    streamed with iterparse and every Placemark is dropped from the tree once its name,
+    description and coordinates are stored, so memory stays flat however many there are."""
+    names = np.empty(capacity, dtype=object)
+    descriptions = np.empty(capacity, dtype=object)
+    longitudes = np.empty(capacity, dtype=np.float64)
+    latitudes = np.empty(capacity, dtype=np.float64)
+    count = 0
+    with ZipFile(io.BytesIO(kmz_content)) as kmz:
+        parents = []
+        for event, element in ElementTree.iterparse(kmz.open('doc.kml'), events=('start', 'end')):
+            if event == 'start':
+                parents.append(element)
+                continue
+            parents.pop()
+            if not element.tag.endswith('Placemark'):
+                continue
+            namespace = element.tag[:-len('Placemark')]
+            coordinates = element.findtext(f'{namespace}Point/{namespace}coordinates')
+            if coordinates and coordinates.strip():
+                if count == len(names):
+                    names, descriptions = grown(names, count + 1), grown(descriptions, count + 1)
+                    longitudes, latitudes = grown(longitudes, count + 1), grown(latitudes, count + 1)
+                longitude, latitude = coordinates.split()[0].split(',')[:2]
+                names[count] = (element.findtext(f'{namespace}name') or '').strip()
+                descriptions[count] = (element.findtext(f'{namespace}description') or '').strip()
+                longitudes[count], latitudes[count] = float(longitude), float(latitude)
+                count += 1
+            if parents:
+                parents[-1].remove(element)
+    return pd.DataFrame({'Name': names[:count], 'Description': descriptions[:count],
+                         'Laengengrad': longitudes[:count], 'Breitengrad': latitudes[:count]})
+
+EVENT_URL = "https://www.berlin.de/polizei/service/versammlungsbehoerde/versammlungen-aufzuege/"
+
+async def update_police_demo_data(conditional=False):
+    """Return a DataFrame containing the demonstrations or protests listed for today including a rough estimation of where it is happening,
+    or None when conditional and neither the page nor the date changed since the last call"""
     currentDate = datetime.now().strftime("%d.%m.%Y")
-    event_url = "https://www.berlin.de/polizei/service/versammlungsbehoerde/versammlungen-aufzuege/"
-    req = requests.get(event_url)
-    soup = BeautifulSoup(req.content, 'html.parser')
-    table_r = soup.findAll("tr", class_="odd line_1")
-    demo_list = []
-    for row in table_r:
+    # The list is filtered by date, so the same page has to be parsed again on a new day
+    with timed("fetch_demo"):
+        content = await http_client().fetch(EVENT_URL, conditional, key=f"{EVENT_URL}#{currentDate}")
+    if content is None:
+        return None
+    with timed("parse_demo"):
+        return await in_refresh_pool(parse_police_demo_data, content, currentDate)
+
+demo_columns = ["Datum", "Von", "Bis", "Thema", "PLZ", "Versammlungsort", "Aufzugsstrecke"]
+
+def parse_police_demo_data(content, currentDate):
+    """Return today's demonstrations from the police table. Only the table rows are parsed,
+    each row's cells are read once by their headers attribute, and rows for other days are
+    skipped before anything else. Rows missing a cell or with an unreadable PLZ are counted
+    and logged. Coordinates come from a vectorized lookup of the PLZ in plz_map. With a
+    STREET_GAZETTEER, the streets of Versammlungsort and Aufzugsstrecke are resolved into
+    the 'Route' column, and rows with an unknown PLZ are placed at the start of their route."""
+    global route_cache
+    rows = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer("tr"))
+    demo_list, malformed = [], 0
+    for row in rows.find_all("tr"):
+        tds = row.find_all("td", recursive=False)
+        # Only the date cell is read before the row is known to be today's
+        if not any("Datum" in (cell.get("headers") or ()) and cell.get_text().strip() == currentDate for cell in tds):
+            continue
+        cells = {}
+        for cell in tds:
+            for header in cell.get("headers") or ():
+                cells[header] = cell.get_text().strip()
         try:
-            if row.find("td", class_="text", headers="Datum").text == currentDate:
-                Datum = row.find("td", class_="text", headers="Datum").text
-                Von = row.find("td", class_="text", headers="Von").text
-                Bis = row.find("td", class_="text", headers="Bis").text
-                Thema = row.find("td", class_="text", headers="Thema").text
-                PLZ = int(row.find("td", class_="text", headers="PLZ").text)
-                Versammlungsort = row.find("td", class_="text", headers="Versammlungsort").text
-                Aufzugsstrecke = row.find("td", class_="text", headers="Aufzugsstrecke").text
-                demo_list.append([Datum,Von,Bis,Thema,PLZ,Versammlungsort,Aufzugsstrecke])
-        except:
+            values = [cells[column] for column in demo_columns]
+            values[demo_columns.index("PLZ")] = int(values[demo_columns.index("PLZ")])
+        except (KeyError, ValueError):
+            malformed += 1
             continue
-    demo_df = pd.DataFrame(demo_list, columns=["Datum","Von","Bis","Thema","PLZ","Versammlungsort","Aufzugsstrecke"])
-    demo_df['Breitengrad'] = demo_df['PLZ'].map(lambda plz: plz_map.get(plz, (None, None))[1])
-    demo_df['Laengengrad'] = demo_df['PLZ'].map(lambda plz: plz_map.get(plz, (None, None))[0])
-    return demo_df.sort_values('Von')
+        demo_list.append(values)
+    if malformed:
+        logger.warning("Skipped %d malformed demonstration rows for %s", malformed, currentDate)
+
+    demo_df = pd.DataFrame(demo_list, columns=demo_columns)
+    longitudes, latitudes = plz_coordinates(demo_df['PLZ'].to_numpy(dtype=np.int64))
+    gazetteer = street_gazetteer()
+    if gazetteer is not None:
+        resolved = {}
+        demo_df['Route'] = [route_polyline(gazetteer, place, route, (lat, lon), resolved)
+                            for place, route, lat, lon in zip(demo_df['Versammlungsort'], demo_df['Aufzugsstrecke'],
+                                                              latitudes, longitudes)]
+        # Only the routes listed now are kept for the next refresh
+        route_cache = resolved
+        starts = np.array([route[:2] if len(route) else (np.nan, np.nan) for route in demo_df['Route']]).reshape(-1, 2)
+        unknown = np.isnan(latitudes)
+        latitudes, longitudes = np.where(unknown, starts[:, 0], latitudes), np.where(unknown, starts[:, 1], longitudes)
+    demo_df['Breitengrad'] = latitudes
+    demo_df['Laengengrad'] = longitudes
+    unlocated = int(demo_df['Breitengrad'].isna().sum())
+    if unlocated:
+        logger.warning("%d demonstrations have a PLZ outside plz_map and no resolvable route", unlocated)
+    return demo_df.sort_values('Von', kind='stable')
+
+def plz_coordinates(plz: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the longitudes and latitudes of plz_map's centroids for an array of PLZ, NaN where unknown."""
+    slots = np.minimum(np.searchsorted(plz_codes, plz), len(plz_codes) - 1)
+    known = plz_codes[slots] == plz
+    longitudes = np.where(known, plz_centroids[slots, 0], np.nan)
+    latitudes = np.where(known, plz_centroids[slots, 1], np.nan)
+    return longitudes, latitudes
+
+# Splits a Versammlungsort or Aufzugsstrecke into street names
+ROUTE_SEPARATORS = re.compile(r"\s+[-–—>]\s+|[,;/|:]|\b(?:Ecke|Höhe|bis|über|via|und|Zwischenkundgebung|Kundgebung)\b",
+                              re.IGNORECASE)
+
+def street_key(name: str) -> str:
+    """Normalize a street name so the spellings used on the police page and in OpenStreetMap
+    match: lower case, without house numbers or remarks in parentheses, Str. and Strasse as Straße."""
+    name = re.sub(r"\(.*?\)", " ", name.lower())
+    name = re.sub(r"\b\d+\s*[a-z]?\b(\s*-\s*\d+\s*[a-z]?\b)?", " ", name)
+    name = re.sub(r"str\.|strasse\b", "straße", name)
+    name = re.sub(r"pl\.", "platz", name)
+    return " ".join(name.replace(".", " ").split())
+
+class StreetGazetteer:
+    """Polylines of every named street, read from the arrays build_gazetteer writes: the
+    ways of name i are name_offsets[i]:name_offsets[i + 1], the points of way w are
+    way_offsets[w]:way_offsets[w + 1], as (lat, lon) in degrees."""
+
+    def __init__(self, path: str):
+        with np.load(path) as arrays:
+            names = arrays['names']
+            self.name_offsets, self.way_offsets = arrays['name_offsets'], arrays['way_offsets']
+            self.points = arrays['points']
+        self.names = {name: i for i, name in enumerate(names.tolist())}
+
+    def polylines(self, name: str) -> list[np.ndarray]:
+        i = self.names.get(street_key(name))
+        if i is None:
+            return []
+        return [self.points[self.way_offsets[way]:self.way_offsets[way + 1]]
+                for way in range(self.name_offsets[i], self.name_offsets[i + 1])]
+
+gazetteer_cache = {}
+
+def street_gazetteer() -> StreetGazetteer | None:
+    """Return the StreetGazetteer at STREET_GAZETTEER, loaded once per file version, or None without one."""
+    try:
+        stamp = os.stat(STREET_GAZETTEER).st_mtime_ns
+    except OSError:
+        return None
+    if (STREET_GAZETTEER, stamp) not in gazetteer_cache:
+        gazetteer_cache.clear()
+        gazetteer_cache[(STREET_GAZETTEER, stamp)] = StreetGazetteer(STREET_GAZETTEER)
+    return gazetteer_cache[(STREET_GAZETTEER, stamp)]
+
+def namesakes(lines: list[np.ndarray]) -> list[list[np.ndarray]]:
+    """Group the ways of one street name into the streets of that name, ways within
+    ROUTE_SPREAD_KM of each other belonging to the same street."""
+    projected = [project(line[:, 0], line[:, 1]) for line in lines]
+    groups = []
+    for i, points in enumerate(projected):
+        nearby = cKDTree(points)
+        joined = [group for group in groups
+                  if any(nearby.query(projected[j])[0].min() <= ROUTE_SPREAD_KM for j in group)]
+        groups = [group for group in groups if group not in joined] + [sorted([i, *itertools.chain(*joined)])]
+    return [[lines[j] for j in group] for group in groups]
+
+# Resolved routes by (Versammlungsort, Aufzugsstrecke, PLZ centroid), kept from one refresh
+# to the next so an unchanged list costs no geometry work
+route_cache = {}
+
+def route_polyline(gazetteer: StreetGazetteer, place: str, route: str, anchor: tuple[float, float],
+                   resolved: dict) -> np.ndarray:
+    """Return the streets named in place and route as one flat array of lat, lon pairs with
+    NaN pairs between streets, empty when none is found. Of the ways of each name only those
+    within ROUTE_SPREAD_KM of the previous street are kept, since a name may exist in several
+    districts; the first street only has to be within twice that of the anchor, the PLZ
+    centroid, as PLZ areas at the outskirts are several km across. Without an anchor, of a
+    first street with namesakes only the one the next street connects to is kept, and if
+    that doesn't single one out the route stays unresolved. Results are recorded in resolved."""
+    key = (place, route, None if np.isnan(anchor[0]) else anchor)
+    if key in route_cache or key in resolved:
+        resolved[key] = route_cache.get(key, resolved.get(key))
+        return resolved[key]
+    streets, seen = [], set()
+    for part in ROUTE_SEPARATORS.split(f"{place} - {route}"):
+        name = street_key(part or "")
+        if name and name not in seen:
+            seen.add(name)
+            streets.append(gazetteer.polylines(name))
+    streets = [candidates for candidates in streets if candidates]
+    if key[2] is None and streets:
+        groups = namesakes(streets[0])
+        if len(groups) > 1 and len(streets) > 1:
+            following = cKDTree(project(*np.concatenate(streets[1]).T))
+            groups = [group for group in groups
+                      if following.query(project(*np.concatenate(group).T))[0].min() <= ROUTE_SPREAD_KM]
+        streets = [groups[0], *streets[1:]] if len(groups) == 1 else []
+    previous = None if key[2] is None else project([anchor[0]], [anchor[1]])
+    polylines, spread = [], 2 * ROUTE_SPREAD_KM
+    for candidates in streets:
+        if previous is not None:
+            nearby = cKDTree(previous)
+            candidates = [line for line in candidates
+                          if nearby.query(project(line[:, 0], line[:, 1]))[0].min() <= spread]
+        if candidates:
+            polylines += candidates
+            previous, spread = project(*np.concatenate(candidates).T), ROUTE_SPREAD_KM
+    separator = np.full((1, 2), np.nan)
+    points = np.concatenate([part for line in polylines for part in (line, separator)][:-1]) if polylines else np.empty((0, 2))
+    resolved[key] = frozen(points.ravel())
+    return resolved[key]
+
+def osm_elements(osm_path: str, tag: str):
+    """Yield the elements with tag from an OpenStreetMap XML file, plain, .bz2 or .gz. Every
+    node, way and relation is dropped from the root once seen, so memory stays flat."""
+    opener = bz2.open if osm_path.endswith('.bz2') else gzip.open if osm_path.endswith('.gz') else open
+    with opener(osm_path, 'rb') as file:
+        events = ElementTree.iterparse(file, events=('start', 'end'))
+        _, root = next(events)
+        for event, element in events:
+            if event != 'end':
+                continue
+            if element.tag == tag:
+                yield element
+            if element.tag in ('node', 'way', 'relation'):
+                root.clear()
+
+def build_gazetteer(osm_path: str, out_path: str = STREET_GAZETTEER) -> int:
+    """Write the named highways of an OpenStreetMap export as a StreetGazetteer and return
+    the number of street names. Reads the file twice, first the ways, then only the nodes
+    they use, so a city extract fits in memory comfortably."""
+    ways = []
+    for way in osm_elements(osm_path, 'way'):
+        tags = {tag.get('k'): tag.get('v') for tag in way.iter('tag')}
+        if 'highway' in tags and tags.get('name'):
+            ways.append((street_key(tags['name']), np.array([int(nd.get('ref')) for nd in way.iter('nd')], dtype=np.int64)))
+    needed = np.unique(np.concatenate([nodes for _, nodes in ways])) if ways else np.empty(0, dtype=np.int64)
+    wanted = set(needed.tolist())
+    coordinates = {}
+    for node in osm_elements(osm_path, 'node'):
+        node_id = int(node.get('id'))
+        if node_id in wanted:
+            coordinates[node_id] = (float(node.get('lat')), float(node.get('lon')))
+    ways = [(name, np.array([coordinates[n] for n in nodes if n in coordinates]).reshape(-1, 2)) for name, nodes in ways]
+    ways = sorted((way for way in ways if len(way[1]) > 1), key=lambda way: way[0])
+
+    names = sorted({name for name, _ in ways})
+    counts = np.array([sum(1 for _ in group) for _, group in itertools.groupby(name for name, _ in ways)], dtype=np.int64)
+    np.savez(out_path if out_path.endswith('.npz') else out_path + '.npz',
+             names=np.array(names, dtype=str),
+             name_offsets=np.concatenate(([0], np.cumsum(counts))),
+             way_offsets=np.concatenate(([0], np.cumsum([len(points) for _, points in ways]))).astype(np.int64),
+             points=np.concatenate([points for _, points in ways]) if ways else np.empty((0, 2)))
+    logger.info("Wrote %d streets of %d ways to %s", len(names), len(ways), out_path)
+    return len(names)
 
 
 # Postleitzahl Map
@@ -347,16 +1352,423 @@ plz_map = {10115: (13.384607458757577, 52.53225310749616),
  15537: (13.687388529541318, 52.38570793162978),
  15566: (13.705366666666666, 52.459782999999995),
  15569: (13.756057865644234, 52.445953729962476)}
+# plz_map as sorted arrays for plz_coordinates
+plz_codes = np.array(sorted(plz_map), dtype=np.int64)
+plz_centroids = np.array([plz_map[plz] for plz in plz_codes], dtype=np.float64)
 
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
 )
 logger = logging.getLogger(__name__)
-# Global variables for dataframes
-toilette_df = None
-water_df = None
-demo_df = None
+# AmenitySnapshots by callback choice. Always replaced as a whole, so a query holding
+# a reference keeps a consistent view while a refresh publishes new snapshots.
+amenities = {}
+# Snapshot cache: per list a Parquet table, the radian coordinates as a memory-mapped
+# .npy, the pickled KD-tree and the GridTable's CSR arrays as .npy, if it has one,
+# listed with their checksums in manifest.json
+cache_lock = threading.Lock()
+
+def cache_path(filename: str) -> str:
+    return os.path.join(CACHE_DIR, filename)
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def write_atomically(path: str, write) -> None:
+    with open(path + '.tmp', 'wb') as file:
+        write(file)
+    os.replace(path + '.tmp', path)
+
+def read_manifest() -> dict | None:
+    try:
+        with open(cache_path('manifest.json')) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('schema') == CACHE_SCHEMA else None
+
+def save_snapshot(choice: str, snapshot: AmenitySnapshot) -> None:
+    """Write a snapshot to the cache, together with the validators of the responses it was parsed from."""
+    table = pd.DataFrame(snapshot.columns).infer_objects()
+    for name in table.columns[table.dtypes == object]:
+        # Parquet needs one type per column, so mixed columns such as Vertrag are stored as text
+        if table[name].dropna().map(type).nunique() > 1:
+            table[name] = table[name].map(lambda value: value if value is None or value != value else str(value))
+    coordinates = np.stack((snapshot.index.lat_rad, snapshot.index.lon_rad))
+    files = {'table': f"{choice}.parquet", 'coordinates': f"{choice}.coordinates.npy", 'tree': f"{choice}.tree.pkl"}
+    if snapshot.grid is not None:
+        files.update(grid_offsets=f"{choice}.grid_offsets.npy", grid_positions=f"{choice}.grid_positions.npy")
+
+    with cache_lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_atomically(cache_path(files['table']), lambda file: table.to_parquet(file, index=False))
+        write_atomically(cache_path(files['coordinates']), lambda file: np.save(file, coordinates))
+        write_atomically(cache_path(files['tree']), lambda file: pickle.dump(snapshot.index.tree, file))
+        if snapshot.grid is not None:
+            write_atomically(cache_path(files['grid_offsets']), lambda file: np.save(file, snapshot.grid.offsets))
+            write_atomically(cache_path(files['grid_positions']), lambda file: np.save(file, snapshot.grid.positions))
+        manifest = read_manifest() or {'schema': CACHE_SCHEMA, 'lists': {}}
+        manifest['lists'][choice] = {
+            'files': {kind: {'file': filename, 'sha256': file_digest(cache_path(filename))}
+                      for kind, filename in files.items()},
+            'validators': snapshot.validators,
+            'version': snapshot.version,
+            'grid': None if snapshot.grid is None else snapshot.grid.parameters()}
+        write_atomically(cache_path('manifest.json'), lambda file: file.write(json.dumps(manifest, indent=1).encode()))
+
+def load_cache() -> dict[str, AmenitySnapshot]:
+    """Return the cached snapshots that are intact, with their coordinates and grid tables memory-mapped, and
+    restore the HTTP validators they were parsed from so they can be revalidated cheaply. A cache from another
+    CACHE_SCHEMA or with files that fail their checksum is skipped and rebuilt by the next refresh."""
+    manifest = read_manifest()
+    if manifest is None:
+        logger.info("No usable snapshot cache in '%s'", CACHE_DIR)
+        return {}
+    snapshots = {}
+    for choice, cached in manifest['lists'].items():
+        files = cached['files']
+        try:
+            for entry in files.values():
+                if file_digest(cache_path(entry['file'])) != entry['sha256']:
+                    raise ValueError(f"checksum mismatch for {entry['file']}")
+            coordinates = np.load(cache_path(files['coordinates']['file']), mmap_mode='r')
+            with open(cache_path(files['tree']['file']), 'rb') as file:
+                tree = pickle.load(file)
+            index = AmenityIndex(coordinates[0], coordinates[1], tree)
+            grid = None
+            if GRID_TABLE and cached['grid'] is not None:
+                grid = GridTable.attach(cached['grid'], np.load(cache_path(files['grid_offsets']['file']), mmap_mode='r'),
+                                        np.load(cache_path(files['grid_positions']['file']), mmap_mode='r'))
+            snapshots[choice] = AmenitySnapshot(pd.read_parquet(cache_path(files['table']['file'])), index, grid,
+                                                cached['version'])
+        except Exception:
+            logger.warning("Ignoring the cached %s list", choice, exc_info=True)
+            continue
+        snapshots[choice].validators = cached['validators']
+        validators.update(cached['validators'])
+    return snapshots
+
+# Shared snapshots: when WORKERS > 1, the refresher writes every new snapshot of a list to
+# one file in SHARED_DIR, lists the current files in head.json and then bumps the 8-byte
+# generation counter. Workers keep the counter memory-mapped, and whenever it changed since
+# they last looked they map the new files. Nothing is copied into a worker: coordinates,
+# grid table and rows are read from the page cache that all processes share.
+shared_role = None
+shared_lock = threading.Lock()
+shared_counter = None
+attached_generation = None
+
+def shared_path(filename: str) -> str:
+    return os.path.join(SHARED_DIR, filename)
+
+def shared_directory() -> None:
+    """Create SHARED_DIR private to this user, and refuse it if anyone else could have put files there."""
+    os.makedirs(SHARED_DIR, mode=0o700, exist_ok=True)
+    status = os.stat(SHARED_DIR)
+    if hasattr(os, 'getuid') and (status.st_uid != os.getuid() or status.st_mode & 0o022):
+        raise PermissionError(f"{SHARED_DIR} must belong to this user and not be writable by others")
+
+def generation_counter(writable: bool = False) -> np.ndarray | None:
+    """Return the memory-mapped generation counter, or None while the refresher hasn't created it."""
+    global shared_counter
+    if shared_counter is None:
+        shared_directory()
+        path = shared_path('generation')
+        if writable and not os.path.exists(path):
+            write_atomically(path, lambda file: file.write(bytes(8)))
+        try:
+            with open(path, 'r+b' if writable else 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 8, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        shared_counter = np.frombuffer(mapped, dtype='<u8', count=1)
+    return shared_counter
+
+def write_shared_snapshot(path: str, choice: str, generation: int, snapshot: AmenitySnapshot, grid: GridTable | None) -> None:
+    """Write a snapshot as a JSON header followed by 64-byte aligned arrays: the coordinates,
+    the grid table if any and every row as JSON on its own, so a reader only decodes the rows it shows.
+    Array values, the demonstrations' routes, are stored as lists and read back as arrays."""
+    names = list(snapshot.columns)
+    array_columns = [name for name, values in snapshot.columns.items()
+                     if any(isinstance(value, np.ndarray) for value in values)]
+    records = [json.dumps([value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+                           for value in values]).encode()
+               for values in zip(*snapshot.columns.values())]
+    arrays = {
+        'lat_rad': np.asarray(snapshot.index.lat_rad, dtype=np.float64),
+        'lon_rad': np.asarray(snapshot.index.lon_rad, dtype=np.float64),
+        'positions': np.asarray(snapshot.index.positions, dtype=np.int64),
+        'row_offsets': np.concatenate(([0], np.cumsum([len(record) for record in records], dtype=np.int64))),
+        'rows': np.frombuffer(b"".join(records), dtype=np.uint8),
+    }
+    if grid is not None:
+        arrays['grid_offsets'] = np.asarray(grid.offsets, dtype=np.int64)
+        arrays['grid_positions'] = np.asarray(grid.positions, dtype=np.int32)
+    if snapshot.routes is not None:
+        arrays['route_segments'] = np.asarray(snapshot.routes.segments, dtype=np.float64)
+        arrays['route_rows'] = np.asarray(snapshot.routes.rows, dtype=np.int64)
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, array.shape, offset]
+        offset += -(-array.nbytes // 64) * 64
+    header = json.dumps({'schema': SHARED_SCHEMA, 'choice': choice, 'generation': generation, 'version': snapshot.version,
+                         'columns': names, 'array_columns': array_columns, 'grid': None if grid is None else grid.parameters(), 'arrays': layout}).encode()
+    start = -(-(8 + len(header)) // 64) * 64
+
+    def write(file):
+        file.write(struct.pack('<Q', len(header)) + header)
+        for name, array in arrays.items():
+            file.seek(start + layout[name][2])
+            file.write(array.tobytes())
+        file.truncate(start + offset)
+    write_atomically(path, write)
+
+def publish_shared(choice: str, snapshot: AmenitySnapshot) -> int:
+    """Publish a snapshot to the workers as the next generation and return that generation.
+    Files of generations older than the previous one are removed; workers still mapping
+    them keep reading them until they move on. Lists without routes get a GridTable, since
+    workers have no KD-tree; lists with routes are ranked by their RouteIndex and need none."""
+    grid = snapshot.grid
+    if grid is None and snapshot.routes is None:
+        grid = GridTable(snapshot.index, shards=GRID_TABLE_SHARDS)
+    with shared_lock:
+        counter = generation_counter(writable=True)
+        generation = int(counter[0]) + 1
+        filename = f"{choice}.{generation}.snapshot"
+        write_shared_snapshot(shared_path(filename), choice, generation, snapshot, grid)
+        try:
+            with open(shared_path('head.json')) as file:
+                head = json.load(file)
+        except (OSError, ValueError):
+            head = {}
+        if head.get('schema') != SHARED_SCHEMA:
+            head = {'schema': SHARED_SCHEMA, 'lists': {}}
+        previous = head['lists'].get(choice)
+        head['lists'][choice] = {'file': filename, 'generation': generation, 'previous': previous and previous['file']}
+        write_atomically(shared_path('head.json'), lambda file: file.write(json.dumps(head, indent=1).encode()))
+        counter[0] = generation
+        keep = {name for entry in head['lists'].values() for name in (entry['file'], entry['previous'])}
+        for name in os.listdir(SHARED_DIR):
+            if name.endswith('.snapshot') and name not in keep:
+                os.remove(shared_path(name))
+    return generation
+
+class SharedSnapshot:
+    """AmenitySnapshot read from a file written by publish_shared, with every array a
+    read-only view into the memory-mapped file. It keeps the version of the snapshot it was
+    written from, so callback payloads stay valid across workers and the refresher."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_length, = struct.unpack_from('<Q', self.mapped)
+        header = json.loads(self.mapped[8:8 + header_length])
+        if header['schema'] != SHARED_SCHEMA:
+            raise ValueError(f"{path} has shared snapshot schema {header['schema']}, expected {SHARED_SCHEMA}")
+        start = -(-(8 + header_length) // 64) * 64
+        arrays = {name: np.frombuffer(self.mapped, dtype=dtype, count=int(np.prod(shape)), offset=start + offset).reshape(shape)
+                  for name, (dtype, shape, offset) in header['arrays'].items()}
+        self.version, self.generation = header['version'], header['generation']
+        self.columns = tuple(header['columns'])
+        self.index = ScanIndex(arrays['lat_rad'], arrays['lon_rad'], arrays['positions'])
+        self.grid = (GridTable.attach(header['grid'], arrays['grid_offsets'], arrays['grid_positions'])
+                     if header['grid'] is not None else None)
+        # The segments stay mapped; only the KD-tree over their midpoints is built per worker
+        self.routes = RouteIndex(arrays['route_segments'], arrays['route_rows']) if 'route_segments' in arrays else None
+        self.row_offsets, self.records = arrays['row_offsets'], arrays['rows']
+        self.array_columns = [self.columns.index(name) for name in header['array_columns']]
+
+    def __len__(self) -> int:
+        return len(self.index.lat_rad)
+
+    def rows(self, positions: np.ndarray) -> list[dict]:
+        rows = []
+        for p in positions:
+            values = json.loads(self.records[self.row_offsets[p]:self.row_offsets[p + 1]].tobytes())
+            for column in self.array_columns:
+                values[column] = np.asarray(values[column], dtype=np.float64)
+            rows.append(dict(zip(self.columns, values)))
+        return rows
+
+def attach_shared() -> None:
+    """Map the snapshots of a newer generation, if the refresher published one. Lists whose
+    file didn't change keep their mapping; on any error the current snapshots stay in use
+    and attaching is retried on the next call."""
+    global amenities, attached_generation
+    counter = generation_counter()
+    if counter is None or int(counter[0]) == attached_generation:
+        return
+    generation = int(counter[0])
+    try:
+        with open(shared_path('head.json')) as file:
+            head = json.load(file)
+        snapshots = {}
+        for choice, entry in head['lists'].items():
+            current = amenities.get(choice)
+            snapshots[choice] = (current if current is not None and current.generation == entry['generation']
+                                 else SharedSnapshot(shared_path(entry['file'])))
+    except (OSError, ValueError, KeyError):
+        logger.warning("Attaching shared generation %d failed", generation, exc_info=True)
+        return
+    amenities = snapshots
+    nearest_cache.retain(snapshot.version for snapshot in amenities.values())
+    attached_generation = generation
+
+def current_amenities() -> dict:
+    """Return the published snapshots, first attaching any newer shared generation in a worker."""
+    if shared_role == "worker":
+        attach_shared()
+    return amenities
+
+# Refresh requests: workers count them in the 8-byte file 'refresh-requests', under an
+# exclusive lock since several may ask at once. The refresher answers the latest request it
+# saw by writing refreshed.json with that count and the lists that failed to update.
+def refresh_requests(increment: int = 0) -> int:
+    """Return the number of refresh requests after adding increment to it."""
+    # Unix only, like the workers themselves, so the single-process bot runs anywhere
+    import fcntl
+    shared_directory()
+    with open(os.open(shared_path('refresh-requests'), os.O_RDWR | os.O_CREAT), 'r+b') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        count = int.from_bytes(file.read(8), 'little') + increment
+        if increment:
+            file.seek(0)
+            file.write(count.to_bytes(8, 'little'))
+    return count
+
+def refreshed() -> dict:
+    """Return the refresher's answer to the latest request it handled."""
+    try:
+        with open(shared_path('refreshed.json')) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {'request': 0, 'failed': []}
+
+async def request_refresh() -> list[str] | None:
+    """Ask the refresher to refresh every list and wait for it. Returns the lists that failed
+    to update, or None if the refresher didn't answer within REFRESH_WAIT."""
+    request = await in_refresh_pool(refresh_requests, 1)
+    deadline = time.monotonic() + REFRESH_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(REFRESH_POLL)
+        answer = await in_refresh_pool(refreshed)
+        if answer['request'] >= request:
+            return answer['failed']
+    return None
+
+async def answer_refresh_requests(failed: list[str]) -> None:
+    """Answer the requests made so far with failed, then refresh all lists whenever a worker asks."""
+    handled = -1
+    while True:
+        request = await in_refresh_pool(refresh_requests)
+        if request != handled:
+            if handled >= 0:
+                failed = await refresh_amenities()
+            answer = json.dumps({'request': request, 'failed': failed}).encode()
+            await in_refresh_pool(write_atomically, shared_path('refreshed.json'), lambda file: file.write(answer))
+            handled = request
+        await asyncio.sleep(REFRESH_POLL)
+
+# Loaders by callback choice. They fetch through the shared SourceClient and parse in the
+# refresh pool, so neither downloads nor parsing block the event loop.
+sources = {"demo": update_police_demo_data, "wc": update_toilettes, "water": update_water}
+refresh_pool = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="refresh")
+source_client = None
+
+def http_client() -> SourceClient:
+    """Return the shared SourceClient, created on first use. Assign source_client to
+    swap in a client with another transport."""
+    global source_client
+    if source_client is None:
+        source_client = SourceClient()
+    return source_client
+
+def in_refresh_pool(func, *args):
+    return asyncio.get_running_loop().run_in_executor(refresh_pool, func, *args)
+# Running refresh per list, joined by anyone asking for that list while it runs
+refresh_tasks = {}
+
+async def load_snapshot(choice: str) -> AmenitySnapshot | None:
+    # Lists that are already loaded are fetched conditionally and left alone when unchanged.
+    # Runs in its own refresh task, so the validators collected here are this list's only.
+    pending = {}
+    fetched_validators.set(pending)
+    df = await sources[choice](conditional=choice in amenities)
+    if df is None:
+        return None
+    snapshot = await in_refresh_pool(AmenitySnapshot, df)
+    snapshot.validators = pending
+    return snapshot
+
+async def refresh_list(choice: str) -> None:
+    global amenities
+    try:
+        snapshot = await load_snapshot(choice)
+    except Exception:
+        logger.exception("Updating the %s list failed", choice)
+        raise
+    if snapshot is None:
+        logger.info("The %s list is unchanged", choice)
+        return
+    amenities = {**amenities, choice: snapshot}
+    validators.update(snapshot.validators)
+    nearest_cache.retain(snapshot.version for snapshot in amenities.values())
+    if shared_role == "refresher":
+        try:
+            await in_refresh_pool(publish_shared, choice, snapshot)
+        except Exception:
+            logger.exception("Publishing the %s list failed", choice)
+    try:
+        await in_refresh_pool(save_snapshot, choice, snapshot)
+    except Exception:
+        logger.exception("Caching the %s list failed", choice)
+
+async def refresh_amenities(choices=None) -> list[str]:
+    """Download the given lists (all by default) concurrently in the refresh pool and publish
+    each new snapshot as soon as it is built, without blocking the event loop. A list that is
+    already being refreshed is joined instead of fetched again, and a list that fails keeps
+    its previous snapshot. Returns the lists that failed to update."""
+    choices = list(sources) if choices is None else choices
+    for choice in choices:
+        if choice not in refresh_tasks or refresh_tasks[choice].done():
+            refresh_tasks[choice] = asyncio.ensure_future(refresh_list(choice))
+    # Shielded so a cancelled caller doesn't cancel the refresh other callers are waiting on
+    results = await asyncio.shield(asyncio.gather(*(refresh_tasks[choice] for choice in choices),
+                                                  return_exceptions=True))
+    return [choice for choice, result in zip(choices, results) if isinstance(result, Exception)]
+
+# Callback payloads: one byte holding the format and amenity, the location quantized to
+# 1e-5 degrees (about 1 m) and the snapshot version the keyboard was built against,
+# packed big-endian and base64url encoded without padding: 18 characters in total.
+CALLBACK_FORMAT = 1
+callback_struct = struct.Struct('>BiiI')
+callback_choices = ("wc", "water", "demo")
+COORDINATE_SCALE = 100_000
+
+def encode_callback(choice: str, my_location: tuple[float, float], version: int) -> str:
+    packed = callback_struct.pack(CALLBACK_FORMAT << 4 | callback_choices.index(choice),
+                                  round(my_location[0] * COORDINATE_SCALE), round(my_location[1] * COORDINATE_SCALE),
+                                  version)
+    return base64.urlsafe_b64encode(packed).rstrip(b'=').decode('ascii')
+
+def decode_callback(data: str) -> tuple[str, tuple[float, float], int]:
+    """Return the choice, location and snapshot version of a payload made by encode_callback.
+    Raises ValueError for anything else."""
+    try:
+        packed = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Callback payload is not base64url: {data!r}") from error
+    if len(packed) != callback_struct.size:
+        raise ValueError(f"Callback payload has {len(packed)} bytes, expected {callback_struct.size}")
+    header, lat, lon, version = callback_struct.unpack(packed)
+    if header >> 4 != CALLBACK_FORMAT or header & 0xF >= len(callback_choices):
+        raise ValueError(f"Unknown callback payload header {header:#04x}")
+    latitude, longitude = lat / COORDINATE_SCALE, lon / COORDINATE_SCALE
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"Callback payload location out of range: {latitude}, {longitude}")
+    return callback_choices[header & 0xF], (latitude, longitude), version
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send message on `/start`."""
@@ -369,11 +1781,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.message.from_user
     user_location = update.message.location
+    my_location = (user_location.latitude, user_location.longitude)
+    # Version 0 marks a list that was not loaded yet when the keyboard was sent
+    versions = {choice: snapshot.version for choice, snapshot in current_amenities().items()}
 
     choice_keyboard = [
-        [InlineKeyboardButton("Public Toilet", callback_data=f"wc,{user_location.latitude},{user_location.longitude}")],
-        [InlineKeyboardButton("Potable Water", callback_data=f"water,{user_location.latitude},{user_location.longitude}")],
-        [InlineKeyboardButton("Demonstrations", callback_data=f"demo,{user_location.latitude},{user_location.longitude}")],
+        [InlineKeyboardButton("Public Toilet", callback_data=encode_callback("wc", my_location, versions.get("wc", 0)))],
+        [InlineKeyboardButton("Potable Water", callback_data=encode_callback("water", my_location, versions.get("water", 0)))],
+        [InlineKeyboardButton("Demonstrations", callback_data=encode_callback("demo", my_location, versions.get("demo", 0)))],
         [InlineKeyboardButton("Update Lists", callback_data="update")]
     ]
 
@@ -381,73 +1796,295 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                     reply_markup=InlineKeyboardMarkup(choice_keyboard))
 
 async def pick_one(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    global toilette_df, water_df, demo_df
     query = update.callback_query
-    await query.answer()
 
     if query.data == "update":
-        demo_df = update_police_demo_data()
-        toilette_df = update_toilettes() 
-        water_df = update_water()
-        await query.message.reply_text("Lists are up to date")
+        await query.answer()
+        # Reply from a separate task so this handler returns and other updates keep flowing
+        context.application.create_task(reply_when_refreshed(query.message), update=update)
         return
 
-    choice, lat, lon = query.data.split(',')
-    my_location = (float(lat), float(lon))
-
-    if choice == "wc":
-        Top5 = location_cal(toilette_df, my_location)
-        # Check if 'Description' column exists, if not use an alternative
-        description_column = 'Description' if 'Description' in Top5.columns else 'Standort'
-        keyboard = [
-            [InlineKeyboardButton(text=f"{Top5['Distance'].iloc[i]:.2f}km - {Top5[description_column].iloc[i]}",
-                                  url=f"https://maps.apple.com/maps?q={Top5['Breitengrad'].iloc[i]},{Top5['Laengengrad'].iloc[i]}")]
-            for i in range(min(3, len(Top5)))
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.reply_text("Closest Options:", reply_markup=reply_markup)
-
-    elif choice == "water":
-        Top5w = location_cal(water_df, my_location)
-        keyboard = [
-            [InlineKeyboardButton(text=f"{Top5w['Distance'].iloc[i]}km - {Top5w['Name'].iloc[i]}", 
-                                  url=f"https://maps.apple.com/maps?q={Top5w['Breitengrad'].iloc[i]},{Top5w['Laengengrad'].iloc[i]}")]
-            for i in range(3)
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.reply_text("Closest Options:", reply_markup=reply_markup)
-
-    elif choice == "demo":
-        Top5demo = location_cal(demo_df, my_location)
-        keyboard = [
-            [InlineKeyboardButton(text=f"~{round(Top5demo['Distance'].iloc[i],1)}km - {Top5demo['Thema'].iloc[i]}", 
-                                  url=f"https://maps.apple.com/maps?q={Top5demo['Versammlungsort'].iloc[i]},{Top5demo['PLZ'].iloc[i]} Berlin")]
-            for i in range(3)
-        ]
+    try:
+        choice, my_location, version = decode_callback(query.data)
+    except ValueError:
+        logger.warning("Ignoring malformed callback data %r", query.data)
+        await query.answer("This button has expired, please send your location again.")
+        return
+    snapshot = current_amenities().get(choice)
+    if snapshot is None:
+        await query.answer()
+        await query.message.reply_text("The lists are still loading, please try again in a moment.")
+        return
+    if version != snapshot.version:
+        await query.answer("The list was updated since, showing the current results.")
+    else:
+        await query.answer()
+    top = location_cal(snapshot, my_location, k=3)
+
+    with timed("keyboard"):
+        if choice == "wc":
+            # Check if 'Description' column exists, if not use an alternative
+            description_column = 'Description' if 'Description' in snapshot.columns else 'Standort'
+            keyboard = [
+                [InlineKeyboardButton(text=f"{row['Distance']:.2f}km - {row[description_column]}",
+                                      url=f"https://maps.apple.com/maps?q={row['Breitengrad']},{row['Laengengrad']}")]
+                for row in top
+            ]
+            title = "Closest Options:"
+
+        elif choice == "water":
+            keyboard = [
+                [InlineKeyboardButton(text=f"{row['Distance']}km - {row['Name']}", 
+                                      url=f"https://maps.apple.com/maps?q={row['Breitengrad']},{row['Laengengrad']}")]
+                for row in top
+            ]
+            title = "Closest Options:"
+
+        elif choice == "demo":
+            keyboard = [
+                [InlineKeyboardButton(text=f"~{round(row['Distance'],1)}km - {row['Thema']}", 
+                                      url=f"https://maps.apple.com/maps?q={row['Versammlungsort']},{row['PLZ']} Berlin")]
+                for row in top
+            ]
+            title = "Nearby Protests:"
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.reply_text("Nearby Protests:", reply_markup=reply_markup)
 
+    with timed("send"):
+        await query.message.reply_text(title, reply_markup=reply_markup)
 
-async def update_data():
-    global toilette_df, water_df, demo_df
-    demo_df = update_police_demo_data()
-    toilette_df = update_toilettes() 
-    water_df = update_water()
 
+async def reply_when_refreshed(message) -> None:
+    if shared_role == "worker":
+        # Only the refresher downloads; ask it and pick up whatever it published
+        failed = await request_refresh()
+        current_amenities()
+        if failed is None:
+            await message.reply_text("The lists are being updated, please try again in a moment.")
+            return
+    else:
+        failed = await refresh_amenities()
+    if failed:
+        await message.reply_text(f"Could not update: {', '.join(failed)}. Using the previous lists.")
+    else:
+        await message.reply_text("Lists are up to date")
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin-only `/stats`: stage timings and cache counters. `/stats prometheus` sends them in
+    the Prometheus text format, `/stats profile` starts the sampling profiler and, sent
+    again, stops it and sends the sampled stacks."""
+    user = update.effective_user
+    if user is None or user.id not in ADMIN_IDS:
+        logger.warning("Ignoring /stats from non-admin user %s", user and user.id)
+        return
+    command = context.args[0] if context.args else ""
+    if command == "prometheus":
+        await update.message.reply_document(io.BytesIO(prometheus_text().encode()), filename="metrics.txt")
+    elif command == "profile" and not profiler.running:
+        profiler.start(threading.get_ident())
+        await update.message.reply_text(f"Profiler on, sampling every {PROFILE_INTERVAL * 1000:.0f} ms. "
+                                        "Send /stats profile again to stop it.")
+    elif command == "profile":
+        stacks = profiler.stop()
+        await update.message.reply_document(io.BytesIO(stacks.encode()), filename="stacks.txt",
+                                            caption=f"{sum(profiler.stacks.values())} samples")
+    else:
+        await update.message.reply_text(stats_text())
 
+async def update_data(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job queue callback refreshing the lists in the job's data."""
+    await refresh_amenities(context.job.data)
 
-def main() -> None:
-    """Run the bot."""
+def retry_delay(choice: str, delay: float) -> float:
+    return min(2 * delay, REFRESH_INTERVALS[choice])
+
+async def retry_missing(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job queue callback loading a list that has no snapshot yet, rescheduling itself with a
+    growing delay until the list loads."""
+    choice, delay = context.job.data
+    await refresh_amenities([choice])
+    if choice not in amenities:
+        delay = retry_delay(choice, delay)
+        logger.warning("The %s list is still missing, retrying in %g s", choice, delay)
+        context.job_queue.run_once(retry_missing, delay, data=(choice, delay), name=f"retry {choice}")
+
+async def warm_up(application: Application) -> None:
+    """Load all lists before the bot starts answering, then keep each one fresh on its own interval.
+    Cached lists are served right away and revalidated against the sources in the background.
+    Workers only attach to the snapshots the refresher publishes."""
+    global amenities
+    if shared_role == "worker":
+        attach_shared()
+        return
+    # Only a cache written without grid tables needs them built, so load it in the refresh pool
+    amenities = await in_refresh_pool(load_cache)
+    if amenities:
+        # A job rather than create_task: post_init runs before the application does
+        application.job_queue.run_once(update_data, 0, data=list(amenities), name="revalidate cache")
+    missing = [choice for choice in sources if choice not in amenities]
+    if missing:
+        await refresh_amenities(missing)
+    for choice, interval in REFRESH_INTERVALS.items():
+        application.job_queue.run_repeating(update_data, interval, first=interval, data=[choice], name=f"refresh {choice}")
+        if choice not in amenities:
+            application.job_queue.run_once(retry_missing, RETRY_DELAY, data=(choice, RETRY_DELAY), name=f"retry {choice}")
+
+
+
+async def close_sources(application: Application) -> None:
+    if source_client is not None:
+        await source_client.aclose()
+
+def webhook_app(application: Application):
+    """Return an ASGI app that queues the updates Telegram posts to WEBHOOK_URL's path,
+    carrying WEBHOOK_SECRET, and rejects everything else."""
+    path = urlparse(WEBHOOK_URL).path or "/"
+
+    async def respond(send, status: int, body: bytes = b"") -> None:
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def app(scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            return
+        if scope['path'] == "/healthz":
+            return await respond(send, 200, b"ok")
+        if METRICS_ENDPOINT and scope['path'] == "/metrics":
+            return await respond(send, 200, prometheus_text().encode())
+        if scope['path'] != path or scope['method'] != "POST":
+            return await respond(send, 404)
+        headers = dict(scope['headers'])
+        # Fails closed: without a configured secret no post is accepted
+        if not WEBHOOK_SECRET or not hmac.compare_digest(headers.get(b'x-telegram-bot-api-secret-token', b""),
+                                                         WEBHOOK_SECRET.encode()):
+            return await respond(send, 403)
+        try:
+            length = int(headers.get(b'content-length') or 0)
+        except ValueError:
+            return await respond(send, 400)
+        if length > MAX_UPDATE_BYTES:
+            return await respond(send, 413)
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body += message.get('body', b"")
+            more = message.get('more_body', False)
+            if len(body) > MAX_UPDATE_BYTES:
+                return await respond(send, 413)
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError("an update is a JSON object")
+            update = Update.de_json(data, application.bot)
+        except (ValueError, TypeError, AttributeError, KeyError):
+            # Valid JSON that isn't an update fails anywhere inside de_json
+            return await respond(send, 400)
+        await application.update_queue.put(update)
+        await respond(send, 200)
+
+    return app
+
+def webhook_server(application: Application) -> uvicorn.Server:
+    host, port = WEBHOOK_LISTEN
+    return uvicorn.Server(uvicorn.Config(webhook_app(application), host=host, port=port,
+                                         interface="asgi3", lifespan="off", log_level="warning"))
+
+async def run_webhook(application: Application, server: uvicorn.Server, sockets=None) -> None:
+    """Serve updates through the webhook server until it exits, with the same start-up and
+    shutdown hooks run_polling would call. The server listens on WEBHOOK_LISTEN unless
+    sockets are given."""
+    async with application:
+        await application.post_init(application)
+        await application.bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+                                          allowed_updates=Update.ALL_TYPES)
+        await application.start()
+        try:
+            await server.serve(sockets)
+        finally:
+            await application.stop()
+            await application.post_shutdown(application)
+
+def build_application() -> Application:
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TOKEN).build()
+    application = (Application.builder().token(TOKEN).base_url(TELEGRAM_API_URL)
+                   .concurrent_updates(CONCURRENT_UPDATES)
+                   .post_init(warm_up).post_shutdown(close_sources).build())
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("stats", stats))
     application.add_handler(CallbackQueryHandler(pick_one))
     application.add_handler(MessageHandler(filters.LOCATION, button))
+    return application
+
+async def refresh_forever() -> None:
+    """Publish the cached lists, then keep every list fresh on its REFRESH_INTERVALS and
+    refresh them all whenever a worker asks."""
+    global amenities
+    amenities = await in_refresh_pool(load_cache)
+    for choice, snapshot in amenities.items():
+        await in_refresh_pool(publish_shared, choice, snapshot)
+    failed = await refresh_amenities()
+
+    async def keep_fresh(choice, interval):
+        delay = RETRY_DELAY
+        while True:
+            if choice in amenities:
+                delay = RETRY_DELAY
+                await asyncio.sleep(interval)
+            else:
+                await asyncio.sleep(delay)
+                delay = retry_delay(choice, delay)
+            await refresh_amenities([choice])
+    try:
+        await asyncio.gather(answer_refresh_requests(failed),
+                             *(keep_fresh(choice, interval) for choice, interval in REFRESH_INTERVALS.items()))
+    finally:
+        if source_client is not None:
+            await source_client.aclose()
+
+def run_refresher() -> None:
+    """Process refreshing the lists for the workers."""
+    global shared_role
+    shared_role = "refresher"
+    asyncio.run(refresh_forever())
+
+def run_worker() -> None:
+    """Process answering webhook updates from the shared snapshots. Every worker binds
+    WEBHOOK_LISTEN with SO_REUSEPORT, so the kernel spreads connections across them."""
+    global shared_role
+    shared_role = "worker"
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(WEBHOOK_LISTEN)
+    application = build_application()
+    asyncio.run(run_webhook(application, webhook_server(application), [listener]))
+
+def main() -> None:
+    """Run the bot, or build the street gazetteer with `gazetteer <osm file>`."""
+    if sys.argv[1:2] == ["gazetteer"]:
+        build_gazetteer(sys.argv[2])
+        return
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise SystemExit("WEBHOOK_URL needs WEBHOOK_SECRET, or anyone could post forged updates to the webhook")
+    if WORKERS > 1:
+        if not WEBHOOK_URL:
+            raise SystemExit("WORKERS > 1 needs WEBHOOK_URL: Telegram hands polled updates to one process only")
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=run_refresher, name="refresher")]
+        processes += [context.Process(target=run_worker, name=f"worker {i}") for i in range(WORKERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+    application = build_application()
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(application, webhook_server(application)))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()